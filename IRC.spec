@@ -3,7 +3,7 @@
 
 a = Analysis(
     ['irc-dcms\\IRC.py'],
-    pathex=[],
+    pathex=['common'],
     binaries=[],
     datas=[],
     hiddenimports=[],
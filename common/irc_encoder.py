@@ -0,0 +1,113 @@
+"""
+IRC PRIVMSG 编码工具，供各个桥接共用。
+
+IRC 的一行消息（包括服务器转发时加上的 ":nick!user@host " 前缀和结尾的 CRLF）
+不能超过 512 字节，超出的部分会被服务器截断。这里按字节计算每个目标可用的长度：
+- split()：按换行和 UTF-8 字符边界把一条消息拆成多行，优先在空格处断开；
+  转发消息（"[QQ] 昵称: 内容"）的后续行会加上同样的 "[QQ] 昵称: " 前缀，
+  其他桥接仍然能识别来源
+- pack()：发送队列积压时，把发往同一目标、来源相同的多条短消息用分隔符
+  合并成一行，减少受限速影响的行数
+"""
+
+from typing import List, Optional, Sequence, Tuple
+import re
+
+MAX_LINE = 512  # 包括结尾的 CRLF
+# 转发消息的来源前缀，例如 "[QQ] 张三: "、"[TG] alice: "
+RELAY_HEADER = re.compile(r"^\[[^\]\s]{1,16}\] [^:\r\n]{1,64}?: ")
+
+
+def relay_header(text: str) -> str:
+    """返回转发消息的来源前缀，不是转发消息时返回空字符串。"""
+    match = RELAY_HEADER.match(text)
+    return match.group(0) if match else ""
+
+
+class IRCEncoder:
+    """按 512 字节限制拆分、合并 PRIVMSG 文本。"""
+
+    def __init__(
+        self,
+        nick: str,
+        user: Optional[str] = None,
+        host_length: int = 63,
+        separator: str = " | ",
+        encoding: str = "utf-8",
+    ) -> None:
+        """
+        Args:
+            nick: 机器人的昵称，昵称变化时直接修改 nick 属性
+            user: 用户名，默认与昵称相同
+            host_length: 预留的主机名长度，服务器转发时会加上 nick!user@host 前缀
+            separator: 合并多条消息时使用的分隔符
+            encoding: 发送时使用的编码
+        """
+        self.nick = nick
+        self.user = user
+        self.host_length = host_length
+        self.separator = separator
+        self.encoding = encoding
+
+    def budget(self, target: str) -> int:
+        """发往 target 的 PRIVMSG 中消息内容可用的字节数。"""
+        user = self.user or self.nick
+        # 服务器转发的形式为 ":nick!~user@host PRIVMSG target :text\r\n"
+        overhead = f":{self.nick}!~{user}@ PRIVMSG {target} :\r\n"
+        return MAX_LINE - self.host_length - len(overhead.encode(self.encoding))
+
+    def _size(self, text: str) -> int:
+        return len(text.encode(self.encoding))
+
+    def split(self, target: str, text: str) -> List[str]:
+        """把消息拆成若干行，每行都不超过 budget(target) 字节。"""
+        limit = self.budget(target)
+        header = relay_header(text)
+        # 前缀过长时后续行不加前缀，避免每行只剩很少的内容
+        if self._size(header) > limit // 2:
+            header = ""
+        lines = []
+        for index, line in enumerate(text.replace("\r\n", "\n").replace("\r", "\n").split("\n")):
+            if not line.strip():
+                continue
+            if index and header and not line.startswith(header):
+                line = header + line
+            lines.extend(self._split_line(line, limit, header))
+        # 部分服务器对空消息返回 "412 No text to send"
+        return lines or [" "]
+
+    def _split_line(self, line: str, limit: int, header: str) -> List[str]:
+        chunks = []
+        while self._size(line) > limit:
+            # 在 UTF-8 字符边界截断，不会拆开多字节字符
+            chunk = line.encode(self.encoding)[:limit].decode(self.encoding, "ignore")
+            # 在最后四分之一内有空格时在空格处断开
+            space = chunk.rfind(" ", len(header))
+            if space > len(chunk) * 3 // 4:
+                chunk = chunk[:space]
+            chunks.append(chunk)
+            line = header + line[len(chunk):].lstrip(" ")
+        if line != header or not chunks:
+            chunks.append(line)
+        return chunks
+
+    def pack(self, target: str, texts: Sequence[str]) -> Tuple[str, int]:
+        """
+        从 texts 开头合并尽可能多的消息，只合并来源前缀相同的相邻消息。
+
+        Returns:
+            (合并后的一行, 合并的消息条数)
+        """
+        limit = self.budget(target)
+        header = relay_header(texts[0])
+        line = texts[0]
+        count = 1
+        for text in texts[1:]:
+            if relay_header(text) != header:
+                break
+            candidate = line + self.separator + text[len(header):]
+            if self._size(candidate) > limit:
+                break
+            line = candidate
+            count += 1
+        return line, count
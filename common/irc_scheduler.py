@@ -0,0 +1,225 @@
+"""
+IRC 发送调度器，供各个桥接共用。
+
+所有发往 IRC 的 PRIVMSG 先进入调度器，再按令牌桶限速发出，避免因
+Excess Flood 被服务器断开。指令响应优先于普通转发消息，队列有上限，
+超出时丢弃最旧的普通消息。提供 IRCEncoder 时，入队的消息按 512 字节限制拆成多行，
+队列积压时把发往同一目标的相邻短消息合并成一行发送。
+
+调度器本身不创建线程，可以用三种方式驱动：
+- start()：启动独立的发送线程
+- pump()：由 IRC reactor 定时调用，例如 reactor.scheduler.execute_every
+- run_async()：在 asyncio 事件循环中作为任务运行
+"""
+
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple
+import asyncio
+import logging
+import threading
+import time
+
+from irc_encoder import IRCEncoder
+
+PRIORITY_COMMAND = 0  # 指令响应
+PRIORITY_RELAY = 1  # 普通转发消息
+
+logger = logging.getLogger("IRCScheduler")
+
+
+class IRCSendScheduler:
+    """令牌桶限速、带优先级的 IRC 发送队列。"""
+
+    def __init__(
+        self,
+        send: Optional[Callable[[str, str], None]] = None,
+        rate: float = 0.5,
+        burst: int = 5,
+        max_queue: int = 500,
+        is_ready: Optional[Callable[[], bool]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        retry_delay: float = 5,
+        encoder: Optional[IRCEncoder] = None,
+        max_pack: int = 10,
+    ) -> None:
+        """
+        Args:
+            send: 实际发送函数 send(target, text)
+            rate: 每秒补充的令牌数，即持续发送速率
+            burst: 令牌桶容量，即允许的突发条数
+            max_queue: 队列最大长度
+            is_ready: 可选，返回连接是否可用；不可用时消息留在队列中
+            on_error: 可选，发送失败时调用，可在其中重连；未提供时等待 retry_delay 秒后重试
+            retry_delay: 发送失败后的重试间隔（秒）
+            encoder: 可选，用于拆分过长的消息、合并积压的短消息
+            max_pack: 积压时最多合并成一行的消息条数
+        """
+        self.send = send
+        self.is_ready = is_ready
+        self.on_error = on_error
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.retry_delay = retry_delay
+        self.encoder = encoder
+        self.max_pack = max_pack
+        self._queues: List[Deque[Tuple[str, str]]] = [deque(), deque()]
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._retry_at = 0.0
+        self._cond = threading.Condition()
+        self.stats = {"sent": 0, "dropped": 0, "errors": 0, "split": 0, "packed": 0}
+
+    def bind(
+        self,
+        send: Callable[[str, str], None],
+        is_ready: Optional[Callable[[], bool]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ) -> None:
+        """重新绑定发送函数，用于机器人对象重建后继续使用原队列。"""
+        with self._cond:
+            self.send = send
+            self.is_ready = is_ready
+            self.on_error = on_error
+            self._cond.notify()
+
+    def submit(self, target: str, text: str, priority: int = PRIORITY_RELAY) -> bool:
+        """
+        加入一条待发送消息，立即返回。
+
+        Returns:
+            bool: 消息是否入队（队列已满且无可丢弃的普通消息时为False）
+        """
+        if self.encoder is None:
+            return self._enqueue(target, text, priority)
+        lines = self.encoder.split(target, text)
+        with self._cond:
+            self.stats["split"] += len(lines) - 1
+            return all([self._enqueue(target, line, priority) for line in lines])
+
+    def _enqueue(self, target: str, text: str, priority: int) -> bool:
+        with self._cond:
+            if self.depth() >= self.max_queue:
+                # 优先丢弃最旧的低优先级消息
+                for queue in reversed(self._queues[priority:]):
+                    if queue:
+                        dropped = queue.popleft()
+                        self.stats["dropped"] += 1
+                        logger.warning(f"IRC send queue full, dropped: {dropped[1]}")
+                        break
+                else:
+                    self.stats["dropped"] += 1
+                    logger.warning(f"IRC send queue full, dropped: {text}")
+                    return False
+            self._queues[priority].append((target, text))
+            self._cond.notify()
+        return True
+
+    def wake(self) -> None:
+        """连接恢复后立即尝试发送，不再等待重试间隔。"""
+        with self._cond:
+            self._retry_at = 0.0
+            self._cond.notify()
+
+    def depth(self) -> int:
+        """队列中等待发送的消息数。"""
+        return sum(len(queue) for queue in self._queues)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _pop(self) -> Optional[Tuple[int, Tuple[str, str]]]:
+        for priority, queue in enumerate(self._queues):
+            if queue:
+                target, text = queue.popleft()
+                if self.encoder is not None and queue and queue[0][0] == target:
+                    # 有积压时合并发往同一目标的相邻消息，减少受限速影响的行数
+                    texts = [text]
+                    for next_target, next_text in queue:
+                        if next_target != target or len(texts) >= self.max_pack:
+                            break
+                        texts.append(next_text)
+                    text, count = self.encoder.pack(target, texts)
+                    for _ in range(count - 1):
+                        queue.popleft()
+                    self.stats["packed"] += count - 1
+                return priority, (target, text)
+        return None
+
+    def pump(self) -> int:
+        """
+        按当前可用令牌发送消息，不等待。
+
+        Returns:
+            int: 本次发送的消息数
+        """
+        sent = 0
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                self._refill(now)
+                if (
+                    self._tokens < 1
+                    or now < self._retry_at
+                    or self.send is None
+                    or (self.is_ready is not None and not self.is_ready())
+                ):
+                    return sent
+                item = self._pop()
+                if item is None:
+                    return sent
+                self._tokens -= 1
+                send, on_error = self.send, self.on_error
+
+            priority, (target, text) = item
+            try:
+                send(target, text)
+            except Exception as e:
+                with self._cond:
+                    self._queues[priority].appendleft((target, text))
+                    self._retry_at = time.monotonic() + self.retry_delay
+                    self.stats["errors"] += 1
+                logger.warning(f"IRC send failed, will retry: {e}")
+                if on_error is not None:
+                    on_error(e)
+                return sent
+            sent += 1
+            with self._cond:
+                self.stats["sent"] += 1
+
+    def next_delay(self) -> Optional[float]:
+        """距离下一次可以发送的秒数，队列为空时返回None。"""
+        with self._cond:
+            if not self.depth():
+                return None
+            if self.send is None or (self.is_ready is not None and not self.is_ready()):
+                return 1.0
+            now = time.monotonic()
+            self._refill(now)
+            token_wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            return max(token_wait, self._retry_at - now, 0.0)
+
+    def start(self) -> threading.Thread:
+        """启动独立的发送线程。"""
+        thread = threading.Thread(target=self._run, name="IRC-Sender", daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self) -> None:
+        while True:
+            self.pump()
+            delay = self.next_delay()
+            with self._cond:
+                # 有新消息或 wake() 时立即醒来
+                if delay is None and not self.depth():
+                    self._cond.wait(timeout=1.0)
+                elif delay:
+                    self._cond.wait(timeout=min(delay, 1.0))
+
+    async def run_async(self) -> None:
+        """在 asyncio 事件循环中持续发送。"""
+        while True:
+            self.pump()
+            delay = self.next_delay()
+            await asyncio.sleep(0.2 if delay is None else max(min(delay, 1.0), 0.01))
@@ -0,0 +1,227 @@
+"""
+进程内的消息中继中心，供各个桥接共用。
+
+默认情况下每个桥接是独立的进程，各自连接 IRC，所有跨平台消息都经过 IRC 频道中转：
+QQ 的消息要先发到 IRC，再由 DCMS 桥根据发送者昵称和 "[QQ]" 等标签拆出来转发，
+每条消息多走一跳，还要占用受限速的 IRC 发送队列。
+
+在同一个进程中运行多个桥接时，各平台的适配器直接向 RelayHub 发布消息：
+- publish()：发布一条来自某个平台的消息，按发送者名称和内容结构化保存，
+  不需要再从字符串中解析标签
+- register()：登记一个目的地（IRC、XMPP、Telegram、QQ、DCMS），每个目的地有
+  独立的队列和发送线程，一个平台发送缓慢或出错不会影响其他平台
+- 消息不会发回来源平台；以感叹号开头的命令和以分号开头的响应不转发
+
+IRC 仍然是其中一个目的地：IRC 用户的消息发布到中继中心，其他平台的消息发送到 IRC 频道。
+其他桥接不再连接 IRC，它们的 "!qqirc"、"!xmppirc" 等指令需要在各自的平台中发送。
+
+启用方式见 relay-hub/run_hub.py，install() 登记的中继中心可由 active() 取得，
+桥接据此判断是否以中继模式运行。
+"""
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Union
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger("RelayHub")
+
+# 不在平台间转发的消息前缀：命令和机器人的响应
+IGNORED_PREFIXES = ("!", ";")
+
+
+class RelayMessage(NamedTuple):
+    """一条待转发的消息。"""
+
+    origin: str  # 来源目的地的名称，例如 "qq"，不会再发回这里
+    platform: str  # 平台标识，例如 "QQ"
+    name: str  # 发送者名称
+    text: str  # 消息内容，不含平台标识和发送者
+    created: float  # 发布时的 time.monotonic()
+
+    def format(self) -> str:
+        """转发时使用的格式，与经过 IRC 中转时相同，例如 "[QQ] 张三: 你好"。"""
+        return f"[{self.platform}] {self.name}: {self.text}"
+
+
+Deliver = Callable[[RelayMessage], Union[None, Awaitable[None]]]
+
+
+class Endpoint:
+    """一个目的地：独立的发送队列和发送线程。"""
+
+    def __init__(
+        self,
+        name: str,
+        deliver: Deliver,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        max_queue: int = 1000,
+        timeout: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            name: 目的地名称
+            deliver: 发送一条消息的函数；指定 loop 时为协程函数
+            loop: 可选，deliver 所在的事件循环，发送线程把协程提交到该循环并等待完成
+            max_queue: 队列中最多等待的消息数，超出时丢弃最旧的
+            timeout: 等待协程完成的最长时间（秒）
+        """
+        self.name = name
+        self.deliver = deliver
+        self.loop = loop
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._queue: Deque[RelayMessage] = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.stats = {"queued": 0, "delivered": 0, "dropped": 0, "failed": 0, "avg_latency": 0.0}
+        self._thread = threading.Thread(target=self._run, name=f"RelayHub-{name}", daemon=True)
+        self._thread.start()
+
+    def put(self, message: RelayMessage) -> None:
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                dropped = self._queue.popleft()
+                self.stats["dropped"] += 1
+                logger.warning(f"{self.name} queue full, dropped: {dropped.format()}")
+            self._queue.append(message)
+            self.stats["queued"] += 1
+            self._cond.notify()
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                message = self._queue.popleft()
+            try:
+                if self.loop is not None:
+                    asyncio.run_coroutine_threadsafe(self.deliver(message), self.loop).result(self.timeout)
+                else:
+                    self.deliver(message)
+            except Exception as e:
+                # 各平台的发送队列自己负责重试，这里只记录
+                self.stats["failed"] += 1
+                logger.error(f"Relay to {self.name} failed: {e}")
+                continue
+            latency = time.monotonic() - message.created
+            self.stats["delivered"] += 1
+            self.stats["avg_latency"] = self.stats["avg_latency"] * 0.9 + latency * 0.1
+
+
+class RelayHub:
+    """按目的地分队列的进程内消息路由，publish() 和 register() 可在任意线程调用。"""
+
+    def __init__(self, max_queue: int = 1000) -> None:
+        """
+        Args:
+            max_queue: 每个目的地的队列中最多等待的消息数
+        """
+        self.max_queue = max_queue
+        self.endpoints: Dict[str, Endpoint] = {}
+        self._lock = threading.Lock()
+        self.stats = {"published": 0, "ignored": 0}
+
+    def register(
+        self,
+        name: str,
+        deliver: Deliver,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        max_queue: Optional[int] = None,
+    ) -> Endpoint:
+        """
+        登记一个目的地，之后发布的其他平台的消息都会发送到这里。
+
+        Args:
+            name: 目的地名称，发布消息时作为 origin，同名的目的地会被替换
+            deliver: 发送一条消息的函数，在该目的地的发送线程中调用；指定 loop 时为协程函数
+            loop: 可选，deliver 所在的事件循环
+            max_queue: 可选，该目的地的队列长度上限
+        """
+        endpoint = Endpoint(name, deliver, loop, max_queue or self.max_queue)
+        with self._lock:
+            previous = self.endpoints.get(name)
+            self.endpoints[name] = endpoint
+        if previous is not None:
+            previous.stop()
+        logger.info(f"Registered endpoint {name}")
+        return endpoint
+
+    def publish(self, origin: str, platform: str, name: str, text: str) -> int:
+        """
+        发布一条消息，立即返回。
+
+        Args:
+            origin: 来源目的地的名称
+            platform: 平台标识，例如 "QQ"
+            name: 发送者名称
+            text: 消息内容
+
+        Returns:
+            int: 消息进入的目的地队列数
+        """
+        if not text or not text.strip() or text.startswith(IGNORED_PREFIXES):
+            with self._lock:
+                self.stats["ignored"] += 1
+            return 0
+        message = RelayMessage(origin, platform, name, text, time.monotonic())
+        with self._lock:
+            endpoints = [endpoint for endpoint_name, endpoint in self.endpoints.items() if endpoint_name != origin]
+            self.stats["published"] += 1
+        for endpoint in endpoints:
+            endpoint.put(message)
+        logger.info(f"Relaying from {origin}: {message.format()}")
+        return len(endpoints)
+
+    def depth(self) -> int:
+        """所有目的地队列中等待发送的消息数。"""
+        with self._lock:
+            endpoints = list(self.endpoints.values())
+        return sum(endpoint.depth() for endpoint in endpoints)
+
+    def endpoint_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各目的地的队列长度和发送统计。"""
+        with self._lock:
+            endpoints = list(self.endpoints.values())
+        return {endpoint.name: dict(endpoint.stats, depth=endpoint.depth()) for endpoint in endpoints}
+
+    def summary(self) -> str:
+        """用于状态指令的简短描述，例如 "irc=0/12, qq=1/30"（队列长度/已发送条数）。"""
+        return ", ".join(
+            f"{name}={stats['depth']}/{stats['delivered']}" for name, stats in self.endpoint_stats().items()
+        )
+
+    def stop(self) -> None:
+        """停止所有目的地的发送线程，队列中未发送的消息被丢弃。"""
+        with self._lock:
+            endpoints: List[Endpoint] = list(self.endpoints.values())
+            self.endpoints.clear()
+        for endpoint in endpoints:
+            endpoint.stop()
+
+
+_active: Optional[RelayHub] = None
+
+
+def install(hub: RelayHub) -> None:
+    """登记当前进程使用的中继中心，之后加载的桥接以中继模式运行。"""
+    global _active
+    _active = hub
+
+
+def active() -> Optional[RelayHub]:
+    """当前进程使用的中继中心，未启用时返回None。"""
+    return _active
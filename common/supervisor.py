@@ -0,0 +1,185 @@
+"""
+组件监督器，供各个桥接共用。
+
+桥接中的每个组件（IRC 客户端、XMPP 客户端、DCMS 轮询、Telegram 应用等）
+交给监督器运行。组件抛出异常时只重启这一个组件，其他组件和进程内的队列、
+状态都不受影响。重启间隔按指数退避并加入随机抖动，避免多个组件或多个桥接
+在服务器恢复时同时重连；组件正常运行超过 reset_after 秒后退避重新从头计算。
+
+组件可以是普通函数（在线程中运行）或协程函数（在 asyncio 事件循环中运行）：
+- start()：在新的守护线程中运行并监督
+- run()：在当前线程中运行并监督，直到组件正常返回
+- spawn() / run_async()：在事件循环中作为任务运行并监督
+
+组件正常返回表示主动退出，不会被重启。
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger("Supervisor")
+
+
+class Backoff:
+    """带随机抖动的指数退避。"""
+
+    def __init__(self, initial: float = 1.0, maximum: float = 300.0, factor: float = 2.0, jitter: float = 0.5) -> None:
+        """
+        Args:
+            initial: 第一次重试前的等待时间（秒）
+            maximum: 等待时间上限（秒）
+            factor: 每次失败后等待时间的倍数
+            jitter: 随机抖动比例，实际等待时间在 [delay * (1 - jitter), delay] 之间
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.failures = 0
+
+    def next(self) -> float:
+        """记录一次失败，返回下一次重试前应等待的秒数。"""
+        delay = min(self.maximum, self.initial * self.factor ** self.failures)
+        self.failures += 1
+        return delay * (1 - self.jitter * random.random())
+
+    def reset(self) -> None:
+        self.failures = 0
+
+
+class ComponentState:
+    """单个组件的运行状态和重启统计。"""
+
+    def __init__(self, name: str, backoff: Backoff) -> None:
+        self.name = name
+        self.backoff = backoff
+        self.running = False
+        self.restarts = 0
+        self.started_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+
+class Supervisor:
+    """按组件重启的监督器，线程和 asyncio 组件都可以使用。"""
+
+    def __init__(
+        self,
+        initial_delay: float = 1.0,
+        max_delay: float = 300.0,
+        factor: float = 2.0,
+        jitter: float = 0.5,
+        reset_after: float = 60.0,
+    ) -> None:
+        """
+        Args:
+            initial_delay: 第一次重启前的等待时间（秒）
+            max_delay: 重启等待时间上限（秒）
+            factor: 连续失败时等待时间的倍数
+            jitter: 随机抖动比例
+            reset_after: 组件连续运行超过该秒数后失败，视为新的一轮，退避从头计算
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.reset_after = reset_after
+        self.components: Dict[str, ComponentState] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _state(self, name: str) -> ComponentState:
+        with self._lock:
+            if name not in self.components:
+                backoff = Backoff(self.initial_delay, self.max_delay, self.factor, self.jitter)
+                self.components[name] = ComponentState(name, backoff)
+            return self.components[name]
+
+    def _started(self, state: ComponentState) -> None:
+        state.running = True
+        state.started_at = time.monotonic()
+
+    def _failed(self, state: ComponentState, error: Exception) -> float:
+        """记录一次失败，返回重启前应等待的秒数。"""
+        state.running = False
+        if state.started_at is not None and time.monotonic() - state.started_at >= self.reset_after:
+            state.backoff.reset()
+        state.restarts += 1
+        state.last_error = f"{type(error).__name__}: {error}"
+        delay = state.backoff.next()
+        logger.error(f"{state.name} failed ({state.last_error}), restart #{state.restarts} in {delay:.1f}s",
+                     exc_info=error)
+        return delay
+
+    def _finished(self, state: ComponentState) -> None:
+        state.running = False
+        logger.info(f"{state.name} exited")
+
+    # 线程组件
+
+    def run(self, name: str, target: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        """在当前线程中运行组件，出错时按退避间隔重启，直到组件正常返回或 stop()。"""
+        state = self._state(name)
+        while not self._stopped.is_set():
+            self._started(state)
+            try:
+                target(*args, **kwargs)
+            except Exception as e:
+                if self._stopped.wait(self._failed(state, e)):
+                    break
+                continue
+            self._finished(state)
+            return
+        state.running = False
+
+    def start(self, name: str, target: Callable[..., Any], *args: Any, **kwargs: Any) -> threading.Thread:
+        """在新的守护线程中运行并监督组件。"""
+        thread = threading.Thread(target=self.run, args=(name, target) + args, kwargs=kwargs, name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        """不再重启线程组件，正在等待重启的组件立即退出。"""
+        self._stopped.set()
+
+    # asyncio 组件
+
+    async def run_async(self, name: str, factory: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> None:
+        """在事件循环中运行组件，每次（重新）启动时调用 factory 创建新的协程。取消任务即停止监督。"""
+        state = self._state(name)
+        while True:
+            self._started(state)
+            try:
+                await factory(*args, **kwargs)
+            except asyncio.CancelledError:
+                state.running = False
+                raise
+            except Exception as e:
+                await asyncio.sleep(self._failed(state, e))
+                continue
+            self._finished(state)
+            return
+
+    def spawn(self, name: str, factory: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> "asyncio.Task":
+        """在正在运行的事件循环中创建监督任务。"""
+        return asyncio.get_running_loop().create_task(self.run_async(name, factory, *args, **kwargs), name=name)
+
+    # 状态
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """各组件的运行状态、重启次数和最近一次错误。"""
+        with self._lock:
+            states = list(self.components.values())
+        return {
+            state.name: {"running": state.running, "restarts": state.restarts, "last_error": state.last_error}
+            for state in states
+        }
+
+    def summary(self) -> str:
+        """用于状态指令的简短描述，例如 "irc=up/2, dcms=down/5"（运行状态/重启次数）。"""
+        return ", ".join(
+            f"{name}={'up' if stats['running'] else 'down'}/{stats['restarts']}" for name, stats in self.stats().items()
+        )
@@ -0,0 +1,165 @@
+"""
+TLS 连接工具，供各个桥接共用。
+
+创建 SSLContext 时要加载系统 CA 证书，开销较大，这里按配置只创建一次并缓存。
+同时按服务器缓存 TLS 会话，断线重连时用它恢复会话（session resumption），
+服务器接受时可以省去完整握手。
+
+单独运行时测量重复连接同一服务器的握手耗时：
+    python tls.py irc.libera.chat 6697 --count 10
+"""
+
+from typing import Any, Dict, Hashable, Optional
+import argparse
+import functools
+import socket
+import ssl
+import threading
+import time
+
+_sessions: Dict[Hashable, ssl.SSLSession] = {}
+_lock = threading.Lock()
+stats = {"handshakes": 0, "resumed": 0}
+
+
+class _ResumableSSLSocket(ssl.SSLSocket):
+    """握手完成后把 TLS 会话存入缓存的 SSLSocket。"""
+
+    _session_key: Optional[Hashable] = None
+    _session_saved = False
+    _handshake_counted = False
+
+    def _remember_session(self) -> None:
+        if not self._handshake_counted:
+            self._handshake_counted = True
+            with _lock:
+                stats["handshakes"] += 1
+                if self.session_reused:
+                    stats["resumed"] += 1
+        session = self.session
+        # TLS 1.3 的会话票据在握手之后才到达，拿到票据前的会话无法用于恢复
+        if session is None or (self.version() == "TLSv1.3" and not session.has_ticket):
+            return
+        with _lock:
+            _sessions[self._session_key] = session
+        self._session_saved = True
+
+    def read(self, len: int = 1024, buffer: Any = None):
+        data = super().read(len, buffer)
+        if not self._session_saved and self._session_key is not None:
+            self._remember_session()
+        return data
+
+    def close(self) -> None:
+        if not self._session_saved and self._session_key is not None and self._sslobj is not None:
+            try:
+                self._remember_session()
+            except (OSError, ValueError):
+                pass
+        super().close()
+
+
+def get_context(check_hostname: bool = True) -> ssl.SSLContext:
+    """
+    获取共用的客户端 SSLContext。
+
+    Args:
+        check_hostname: 是否校验证书中的主机名；为False时仍校验证书链
+    """
+    return _create_context(bool(check_hostname))
+
+
+@functools.lru_cache(maxsize=None)
+def _create_context(check_hostname: bool) -> ssl.SSLContext:
+    context = ssl.create_default_context()
+    context.check_hostname = check_hostname
+    context.sslsocket_class = _ResumableSSLSocket
+    return context
+
+
+def wrap_socket(
+    sock: socket.socket,
+    server_hostname: Optional[str] = None,
+    check_hostname: bool = True,
+    session_key: Optional[Hashable] = None,
+) -> ssl.SSLSocket:
+    """
+    用共用的 SSLContext 包装 socket，有缓存的会话时尝试恢复。
+
+    sock 可以尚未连接（握手在 connect 时进行），此时需要提供 server_hostname 或 session_key。
+
+    Args:
+        sock: 要包装的 socket
+        server_hostname: 服务器主机名，用于 SNI 和主机名校验
+        check_hostname: 是否校验主机名
+        session_key: 可选，会话缓存的键，默认为主机名或对端地址
+    """
+    if session_key is None:
+        session_key = server_hostname
+    if session_key is None:
+        try:
+            session_key = sock.getpeername()
+        except OSError:
+            session_key = None
+    with _lock:
+        session = _sessions.get(session_key) if session_key is not None else None
+    context = get_context(check_hostname and server_hostname is not None)
+    # 服务器不接受缓存的会话时会自动进行完整握手
+    ssl_sock = context.wrap_socket(sock, server_hostname=server_hostname, session=session)
+    ssl_sock._session_key = session_key
+    return ssl_sock
+
+
+def forget(session_key: Hashable) -> None:
+    """丢弃某个服务器的缓存会话。"""
+    with _lock:
+        _sessions.pop(session_key, None)
+
+
+def irc_connect_factory(server: str, check_hostname: bool = True):
+    """
+    用于 irc.client 的 TLS 连接工厂，传给 connect(connect_factory=...)。
+    同一个工厂可以重复用于重连，每次连接都会尝试恢复上一次的 TLS 会话。
+    """
+    import irc.connection
+
+    return irc.connection.Factory(
+        wrapper=functools.partial(wrap_socket, server_hostname=server, check_hostname=check_hostname)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="测量 TLS 重连的握手耗时")
+    parser.add_argument("host")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--count", type=int, default=10, help="连接次数")
+    parser.add_argument("--no-cache", action="store_true", help="每次新建 SSLContext 且不恢复会话，用于对比")
+    parser.add_argument("--cafile", help="额外信任的 CA 证书，用于测试自签名的本地服务器")
+    args = parser.parse_args()
+    if args.cafile:
+        get_context().load_verify_locations(args.cafile)
+
+    timings = []
+    for _ in range(args.count):
+        started = time.perf_counter()
+        raw = socket.create_connection((args.host, args.port), timeout=10)
+        if args.no_cache:
+            sock = ssl.create_default_context(cafile=args.cafile).wrap_socket(raw, server_hostname=args.host)
+        else:
+            sock = wrap_socket(raw, server_hostname=args.host)
+        timings.append(time.perf_counter() - started)
+        reused = sock.session_reused
+        # 读一次数据，让 TLS 1.3 的会话票据到达
+        sock.settimeout(2)
+        try:
+            sock.recv(1)
+        except (socket.timeout, OSError):
+            pass
+        sock.close()
+        print(f"connect+handshake {timings[-1] * 1000:.1f} ms  resumed={reused}")
+    print(f"average {sum(timings) / len(timings) * 1000:.1f} ms, first {timings[0] * 1000:.1f} ms, "
+          f"rest {sum(timings[1:]) / max(len(timings) - 1, 1) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+from typing import Optional, List, Dict, Any, Iterable
+import asyncio
+import json
+
+import aiohttp
+from yarl import URL
+
+from DCMS import BASE_URL, COOKIES_FILE, DCMS, EchoFilter, NicknameCache, RoomListing, RoomSync, load_cookies, save_cookies
+
+class AsyncDCMS:
+    """
+    DCMS API的asyncio客户端，接口与 DCMS 相同，所有网络方法均为协程。
+
+    所有请求共用一个 aiohttp 连接池，适合在 NoneBot、python-telegram-bot
+    等运行在事件循环上的桥接中使用，不会阻塞事件循环。
+    """
+
+    room_id = DCMS.room_id
+    pool_size = DCMS.pool_size
+    max_sync_pages = DCMS.max_sync_pages
+    max_retries = 3  # GET请求遇到服务端错误或网络错误时的最大重试次数
+    backoff_factor = 1
+    retry_statuses = (500, 502, 503, 504)
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        cookies_file: str = COOKIES_FILE,
+        nickname_cache_file: Optional[str] = None,
+        base_url: str = BASE_URL,
+    ) -> None:
+        """
+        初始化DCMS客户端。
+
+        Args:
+            username: 用户名
+            password: 密码
+            cookies_file: cookies缓存文件，仅用于启动时恢复会话
+            nickname_cache_file: 可选，昵称缓存文件，重启后无需重新查询
+            base_url: API地址，测试时可指向本地的模拟服务器
+        """
+        self.username = username
+        self.password = password
+        self.cookies_file = cookies_file
+        self.base_url = base_url
+        self._cursors = {}  # 聊天室ID -> 读取游标
+        self._listing = RoomListing()
+        self._echoes = EchoFilter()
+
+        self.session = None  # 在事件循环中首次请求时创建
+        self._auth_lock = None
+        self._cursor_locks = {}  # 聊天室ID -> 保护该聊天室游标的锁
+        self._auth_generation = 0  # 每次重新登录后递增，避免多个协程重复登录
+
+        self.nicknames = NicknameCache(path=nickname_cache_file)
+
+    async def __aenter__(self) -> "AsyncDCMS":
+        self._ensure_session()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        """创建连接池和会话，并从缓存文件恢复cookies。"""
+        if self.session is None or self.session.closed:
+            jar = aiohttp.CookieJar(unsafe=True)
+            cookies = load_cookies(self.cookies_file)
+            if cookies:
+                jar.update_cookies(cookies, URL(self.base_url))
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                cookie_jar=jar,
+                timeout=aiohttp.ClientTimeout(total=5),
+            )
+            self._auth_lock = asyncio.Lock()
+            self._cursor_locks = {}
+        return self.session
+
+    async def close(self) -> None:
+        """关闭连接池。"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def login(self, force: bool = False, room_ids: Optional[Iterable[int]] = None) -> bool:
+        """
+        登录DCMS系统，并把各聊天室的读取游标定位到最新消息。
+
+        若缓存的cookies仍然有效则直接复用，不再重新登录。
+
+        Args:
+            force: 是否忽略缓存的cookies强制重新登录
+            room_ids: 可选，需要定位游标的聊天室，默认为 room_id
+        Returns:
+            bool: 登录是否成功
+        """
+        if not force and await self._is_cookies_valid():
+            print("使用缓存的cookies")
+        elif not await self._authenticate():
+            return False
+
+        await asyncio.gather(*(self._get_last_message_id_from_room(room_id) for room_id in room_ids or [self.room_id]))
+        print("登录成功")
+        return True
+
+    async def _authenticate(self) -> bool:
+        """使用用户名和密码登录，并把新的cookies写入缓存文件。"""
+        session = self._ensure_session()
+        session.cookie_jar.clear()
+        async with session.post(
+            f"{self.base_url}api.php",
+            params={"action": "login"},
+            data={"nick": self.username, "password": self.password},
+        ) as response:
+            data = json.loads(await response.text())
+
+        if data["status"] != "success":
+            print(f"登录失败: {data['message']}")
+            return False
+
+        self._auth_generation += 1
+        self._save_cookies()
+        return True
+
+    def _save_cookies(self) -> None:
+        """将内存中的cookies写入缓存文件。"""
+        save_cookies(self.cookies_file, {cookie.key: cookie.value for cookie in self.session.cookie_jar})
+
+    async def _is_cookies_valid(self) -> bool:
+        """验证cookies是否有效。"""
+        session = self._ensure_session()
+        if not len(session.cookie_jar):
+            return False
+
+        async with session.post(f"{self.base_url}api.php") as response:
+            return json.loads(await response.text()).get("status") == "success"
+
+    async def _reauthenticate(self, generation: int) -> bool:
+        """
+        请求返回错误后按需重新登录。
+
+        Args:
+            generation: 发出请求时的登录代数
+
+        Returns:
+            bool: 是否已获得新的会话，调用方可以重试请求
+        """
+        async with self._auth_lock:
+            if self._auth_generation != generation:
+                # 其他协程已经重新登录过了
+                return True
+            if await self._is_cookies_valid():
+                # 会话仍然有效，说明错误与认证无关
+                return False
+            return await self._authenticate()
+
+    async def _send(self, method: str, params: Dict[str, Any], data: Optional[Dict[str, Any]]) -> str:
+        """发送请求并返回响应文本，GET请求在服务端错误或网络错误时按退避重试。"""
+        session = self._ensure_session()
+        retries = self.max_retries if method == "get" else 0
+        for attempt in range(retries + 1):
+            try:
+                async with session.request(method, f"{self.base_url}api.php", params=params, data=data) as response:
+                    if response.status not in self.retry_statuses or attempt == retries:
+                        return await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == retries:
+                    raise
+            await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def _request(
+        self,
+        method: str,
+        action: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        调用API接口，遇到认证错误时重新登录并重试一次。
+
+        Args:
+            method: HTTP方法
+            action: API动作名
+            params: 附加的查询参数
+            data: POST表单数据
+
+        Returns:
+            Dict 接口返回的JSON，失败时返回None
+        """
+        query = {"action": action, **(params or {})}
+
+        for attempt in range(2):
+            generation = self._auth_generation
+            text = await self._send(method, query, data)
+            if not text.startswith('{"status":"error"'):
+                return json.loads(text)
+            if attempt or not await self._reauthenticate(generation):
+                break
+
+        print(f"错误: {text}")
+        return None
+
+    async def post_message(self, message: str, platform: str = "", name: str = "") -> None:
+        """
+        发送消息到留言板。
+
+        Args:
+            message: 消息内容
+            platform: 可选，平台标识
+            name: 可选，发送者名称
+        """
+        if platform and name:
+            message = f"[{platform}] {name}: {message}"
+
+        await self._request("post", "guest-msg-add", data={"msg": message})
+
+    async def get_message_board(self) -> Optional[List[Dict[str, Any]]]:
+        """获取留言板消息。"""
+        data = await self._request("get", "guest-msg-list", {"page": 1})
+        return data.get("data", []) if data is not None else None
+
+    async def post_message_room(
+        self,
+        message: str,
+        platform: str = "",
+        name: str = "",
+        room_id: Optional[int] = None,
+    ) -> None:
+        """
+        发送消息到聊天室。
+
+        Args:
+            message: 消息内容
+            platform: 可选，平台标识
+            name: 可选，发送者名称
+            room_id: 可选，目标聊天室，默认为 room_id
+        """
+        if platform and name:
+            message = f"[{platform}] {name}: {message}"
+
+        room_id = room_id or self.room_id
+        data = await self._request("post", "chat-msg-add", {"room": room_id}, {"msg": message})
+        if data is not None:
+            # 只记录自己发送的ID，不移动读取游标
+            self._echoes.add(int(data["id"]))
+
+    async def get_message_room(
+        self,
+        page: int = 1,
+        since_id: Optional[int] = None,
+        room_id: Optional[int] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取聊天室消息，按ID从新到旧排列。
+
+        Args:
+            page: 页码
+            since_id: 可选，只需要ID大于该值的消息；服务端不支持时自动停用
+            room_id: 可选，聊天室ID，默认为 room_id
+        """
+        params = self._listing.params(room_id or self.room_id, page, since_id)
+        data = await self._request("get", "chat-msg-list", params)
+        if data is None:
+            return None
+
+        messages = data.get("data", [])
+        self._listing.observe(params, messages)
+        return messages
+
+    def _cursor_lock(self, room_id: int) -> asyncio.Lock:
+        """返回保护指定聊天室读取游标的锁。"""
+        self._ensure_session()
+        return self._cursor_locks.setdefault(room_id, asyncio.Lock())
+
+    async def get_new_messages_from_room(
+        self,
+        include_own: bool = False,
+        room_id: Optional[int] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取自上次检查以来的聊天室新消息，翻页规则与 DCMS.get_new_messages_from_room 相同。
+
+        Args:
+            include_own: 是否包含本客户端自己发送的消息
+            room_id: 可选，聊天室ID，默认为 room_id
+
+        Returns:
+            List 新消息的列表（从旧到新），请求失败时返回None
+        """
+        room_id = room_id or self.room_id
+        async with self._cursor_lock(room_id):
+            messages = await self._sync_room(room_id)
+        if messages is None or include_own:
+            return messages
+        return self._echoes.filter(messages)
+
+    async def _sync_room(self, room_id: int) -> Optional[List[Dict[str, Any]]]:
+        """从读取游标开始同步聊天室消息并移动游标，调用方需持有该聊天室的游标锁。"""
+        sync = RoomSync(room_id, self._cursors.get(room_id, 0), self.max_sync_pages)
+        page = sync.page
+        while page:
+            messages = await self.get_message_room(page, since_id=sync.cursor, room_id=room_id)
+            if messages is None:
+                # 翻页中途失败时不移动游标，下次轮询重新同步
+                return None
+            page = sync.feed(messages, self._listing.page_size)
+
+        self._cursors[room_id], messages = sync.result()
+        return messages
+
+    async def _get_last_message_id_from_room(self, room_id: Optional[int] = None) -> None:
+        """获取最后一条消息的ID。"""
+        room_id = room_id or self.room_id
+        messages = await self.get_message_room(room_id=room_id)
+        if messages:
+            async with self._cursor_lock(room_id):
+                self._cursors[room_id] = messages[0]['id']
+
+    async def get_user_info(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取用户信息。
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            Dict 包含用户信息的字典，失败时返回None
+        """
+        return await self._request("get", "user-info", {"id": user_id})
+
+    async def get_user_nickname(self, user_id: int) -> Optional[str]:
+        """
+        获取用户昵称，优先使用缓存。
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            str: 用户昵称，获取失败时返回None
+        """
+        nick = self.nicknames.get(user_id)
+        if nick is not None:
+            return nick
+
+        user_info = await self.get_user_info(user_id)
+        if not user_info:
+            return None
+        nick = user_info['data']['nick']
+        self.nicknames.put(user_id, nick)
+        return nick
+
+    async def prefetch_user_nicknames(self, user_ids: Iterable[int]) -> None:
+        """
+        并发查询一批用户中尚未缓存的昵称，每个用户只查询一次。
+
+        Args:
+            user_ids: 用户ID，可以有重复
+        """
+        missing = [user_id for user_id in dict.fromkeys(user_ids) if self.nicknames.get(user_id) is None]
+        if not missing:
+            return
+
+        await asyncio.gather(*(self.get_user_nickname(user_id) for user_id in missing))
+        self.nicknames.save()
@@ -1,16 +1,387 @@
-from typing import Optional, List, Dict, Any
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Iterable, Tuple
 import json
+import threading
+import time
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3 import Retry
 
 BASE_URL = "https://3g.cx/"
+COOKIES_FILE = "cookies.json"
+
+
+class AdaptiveInterval:
+    """根据聊天室活跃程度调整轮询间隔：有新消息时加快，空闲时逐步放慢。"""
+
+    def __init__(self, min_interval: float = 1.0, max_interval: float = 10.0, factor: float = 1.5) -> None:
+        """
+        Args:
+            min_interval: 最短轮询间隔（秒）
+            max_interval: 最长轮询间隔（秒）
+            factor: 每次空闲轮询后间隔的放大倍数
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.current = min_interval
+
+    def next(self, active: bool) -> float:
+        """
+        根据本次轮询结果返回下一次轮询前的等待时间。
+
+        Args:
+            active: 本次轮询是否收到了新消息
+        """
+        if active:
+            self.current = self.min_interval
+        else:
+            self.current = min(self.current * self.factor, self.max_interval)
+        return self.current
+
+
+class NicknameCache:
+    """线程安全的用户昵称缓存，按LRU淘汰并带有过期时间，可选持久化到磁盘。"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600, path: Optional[str] = None) -> None:
+        """
+        Args:
+            max_size: 最多缓存的用户数
+            ttl: 缓存有效期（秒）
+            path: 可选，磁盘缓存文件，用于重启后预热
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()  # user_id -> (nick, 写入时间)
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path:
+            self.load()
+
+    def get(self, user_id: int) -> Optional[str]:
+        """返回缓存的昵称，不存在或已过期时返回None。"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def put(self, user_id: int, nick: str) -> None:
+        """写入昵称，超出容量时淘汰最久未使用的条目。"""
+        with self._lock:
+            self._entries[user_id] = (nick, time.time())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def load(self) -> None:
+        """从磁盘缓存文件恢复未过期的条目。"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            print("昵称缓存文件已损坏")
+            return
+
+        now = time.time()
+        with self._lock:
+            for user_id, (nick, stamp) in sorted(stored.items(), key=lambda item: item[1][1]):
+                if now - stamp <= self.ttl:
+                    self._entries[int(user_id)] = (nick, stamp)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def save(self) -> None:
+        """有新条目时写回磁盘缓存文件。"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            stored = {str(user_id): list(entry) for user_id, entry in self._entries.items()}
+            self._dirty = False
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(stored, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"保存昵称缓存失败: {e}")
+
+
+class RecentIds:
+    """线程安全的有界ID集合，超出容量时淘汰最早加入的ID。"""
+
+    def __init__(self, max_size: int = 256) -> None:
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, item_id: int) -> None:
+        with self._lock:
+            self._ids[item_id] = None
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def __contains__(self, item_id: int) -> bool:
+        with self._lock:
+            return item_id in self._ids
+
+
+class EchoFilter:
+    """过滤本客户端发送的消息的回显，供 DCMS 和 AsyncDCMS 共用。"""
+
+    def __init__(self, max_size: int = 256) -> None:
+        self._posted_ids = RecentIds(max_size)  # 本客户端发送过的消息ID
+        self.own_user_id = None  # 从回显中得知的本账号用户ID
+
+    def add(self, message_id: int) -> None:
+        """记录发送成功后服务端返回的消息ID。"""
+        self._posted_ids.add(message_id)
+
+    def filter(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """去掉本客户端和本账号发送的消息，顺序不变。"""
+        for message in messages:
+            if message['id'] in self._posted_ids:
+                self.own_user_id = message['id_user']
+        return [
+            message for message in messages
+            if message['id'] not in self._posted_ids and message['id_user'] != self.own_user_id
+        ]
+
+
+class RoomListing:
+    """聊天室消息列表接口的特性：每页最大消息数，以及服务端是否支持 since 参数。"""
+
+    def __init__(self) -> None:
+        self.since_supported = None  # None 表示尚未确定
+        self.page_size = 0  # 观察到的每页最大消息数
+
+    def params(self, room_id: int, page: int, since_id: Optional[int]) -> Dict[str, Any]:
+        """chat-msg-list 的查询参数，已知服务端不支持 since 时不再携带。"""
+        params = {"room": room_id, "page": page}
+        if since_id and self.since_supported is not False:
+            params["since"] = since_id
+        return params
+
+    def observe(self, params: Dict[str, Any], messages: List[Dict[str, Any]]) -> None:
+        """根据一次请求的结果更新每页大小和 since 支持情况。"""
+        self.page_size = max(self.page_size, len(messages))
+        if "since" in params and messages:
+            # 返回了旧消息说明服务端忽略了 since 参数
+            self.since_supported = all(message['id'] > params["since"] for message in messages)
+
+
+class RoomSync:
+    """
+    一次聊天室同步的翻页状态，只做判断不发请求，供 DCMS 和 AsyncDCMS 共用。
+
+    从第一页开始把每页消息交给 feed()，直到它返回None。第一页没有追上读取游标时
+    继续向后翻页，避免两次轮询之间的消息超过一页时丢失。
+    """
+
+    def __init__(self, room_id: int, cursor: int, max_pages: int) -> None:
+        """
+        Args:
+            room_id: 聊天室ID，仅用于警告信息
+            cursor: 读取游标，即上次读到的最大消息ID
+            max_pages: 最多翻页数
+        """
+        self.room_id = room_id
+        self.cursor = cursor
+        self.max_pages = max_pages
+        self.page = 1
+        self._messages = {}  # 消息ID -> 消息
+        self._oldest_seen = None
+
+    def feed(self, messages: List[Dict[str, Any]], page_size: int) -> Optional[int]:
+        """
+        记录当前页的消息。
+
+        Args:
+            messages: 当前页的消息
+            page_size: 观察到的每页最大消息数
+
+        Returns:
+            int: 需要继续读取的页码，同步完成时返回None
+        """
+        fresh = [message for message in messages if message['id'] > self.cursor]
+        for message in fresh:
+            self._messages[message['id']] = message
+
+        if not messages or not self.cursor or len(fresh) < len(messages) or len(messages) < page_size:
+            return None
+        oldest = min(message['id'] for message in messages)
+        if self._oldest_seen is not None and oldest >= self._oldest_seen:
+            # 服务端忽略了页码参数
+            return None
+        self._oldest_seen = oldest
+
+        if self.page >= self.max_pages:
+            print(f"警告: 聊天室 {self.room_id} 的新消息超过 {self.max_pages} 页，部分消息可能丢失")
+            return None
+        self.page += 1
+        return self.page
+
+    def result(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """同步后的读取游标和新消息（从旧到新）。"""
+        cursor = max(self._messages, default=self.cursor)
+        return cursor, [self._messages[message_id] for message_id in sorted(self._messages)]
+
+
+def load_cookies(path: str) -> Optional[Dict[str, str]]:
+    """读取cookies缓存文件，文件不存在或已损坏时返回None。"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print("未找到cookies文件")
+        return None
+    except ValueError:
+        print("cookies文件已损坏")
+        return None
+
+
+def save_cookies(path: str, cookies: Dict[str, str]) -> None:
+    """将cookies写入缓存文件。"""
+    try:
+        with open(path, "w") as f:
+            json.dump(cookies, f)
+    except OSError as e:
+        print(f"保存cookies失败: {e}")
+
+
+class PostCoalescer:
+    """
+    合并发往聊天室的消息：一个时间窗口内到达同一聊天室的多行消息合并成一条多行消息发送。
+
+    add() 只入队并立即返回，队列已满时丢弃最旧的消息。后台线程按窗口合并，
+    指定分发器时合并后的消息按聊天室交给分发器发送，一个聊天室发送缓慢不影响其他聊天室。
+    """
+
+    def __init__(
+        self,
+        dcms: "DCMS",
+        window: float = 0.5,
+        max_length: int = 2000,
+        dispatcher=None,
+        max_pending: int = 1000,
+    ) -> None:
+        """
+        Args:
+            dcms: 用于发送消息的DCMS客户端
+            window: 合并窗口（秒），从窗口内第一条消息到达时开始计时
+            max_length: 每条合并消息的最大字符数
+            dispatcher: 可选，RelayDispatcher；未指定时在合并线程中直接发送
+            max_pending: 等待合并的最大行数
+        """
+        self.dcms = dcms
+        self.window = window
+        self.max_length = max_length
+        self.dispatcher = dispatcher
+        self.max_pending = max_pending
+        self._pending = []
+        self._cond = threading.Condition()
+        self.stats = {"windows": 0, "lines": 0, "posts": 0, "dropped": 0}
+        self.last_window = {"lines": 0, "posts": 0, "chars": 0}
+        self._thread = threading.Thread(target=self._run, name="DCMS-Coalescer", daemon=True)
+        self._thread.start()
+
+    def add(self, message: str, platform: str = "", name: str = "", room_id: Optional[int] = None) -> None:
+        """
+        加入一条待发送的消息。
+
+        Args:
+            message: 消息内容
+            platform: 可选，平台标识
+            name: 可选，发送者名称
+            room_id: 可选，目标聊天室，默认为 DCMS.room_id
+        """
+        if platform and name:
+            message = f"[{platform}] {name}: {message}"
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                _, dropped = self._pending.pop(0)
+                self.stats["dropped"] += 1
+                print(f"合并队列已满，丢弃: {dropped}")
+            self._pending.append((room_id, message))
+            self._cond.notify()
+
+    def depth(self) -> int:
+        """等待合并的行数。"""
+        with self._cond:
+            return len(self._pending)
+
+    def _pack(self, lines: List[str]) -> List[str]:
+        """按顺序把多行消息打包成不超过 max_length 的若干条消息，超长的单行拆成多条。"""
+        pieces = []
+        for line in lines:
+            pieces.extend(line[start:start + self.max_length] for start in range(0, len(line), self.max_length))
+        posts = []
+        current = ""
+        for line in pieces:
+            if current and len(current) + 1 + len(line) > self.max_length:
+                posts.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}" if current else line
+        if current:
+            posts.append(current)
+        return posts
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(self.window)
+            with self._cond:
+                pending, self._pending = self._pending, []
+
+            rooms = OrderedDict()
+            for room_id, line in pending:
+                rooms.setdefault(room_id, []).append(line)
+
+            lines = [line for _, line in pending]
+            posts = []
+            for room_id, room_lines in rooms.items():
+                for post in self._pack(room_lines):
+                    posts.append(post)
+                    if self.dispatcher is not None:
+                        # 与逐条发送使用相同的目标标识，同一聊天室的消息按顺序发送
+                        key = f"dcms:{room_id or self.dcms.room_id}"
+                        self.dispatcher.submit(key, self.dcms.post_message_room, post, room_id=room_id)
+                        continue
+                    try:
+                        self.dcms.post_message_room(post, room_id=room_id)
+                    except Exception as e:
+                        print(f"发送合并消息失败: {e}")
+
+            # 状态指令在其他线程中读取，统计在锁内更新
+            with self._cond:
+                self.stats["windows"] += 1
+                self.stats["lines"] += len(lines)
+                self.stats["posts"] += len(posts)
+                self.last_window = {"lines": len(lines), "posts": len(posts), "chars": sum(map(len, posts))}
+
+    def get_stats(self) -> Dict[str, int]:
+        """累计统计的一致快照。"""
+        with self._cond:
+            return dict(self.stats)
+
 
 class DCMS:
     """DCMS API客户端，用于与留言板系统交互。"""
 
-    room_id = 34
+    room_id = 34  # 默认聊天室，各方法的 room_id 参数未指定时使用
 
     retry_strategy = Retry(
         total=3,  # 最大重试次数
@@ -18,70 +389,174 @@ class DCMS:
         status_forcelist=[500, 502, 503, 504],  # 对于这些状态码进行重试
     )
 
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    pool_size = 10  # 连接池大小，所有请求复用同一组 keep-alive 连接
+    max_sync_pages = 10  # 检测到消息断档时最多向前翻的页数
 
-    # 创建一个会话并使用该适配器
-    session = requests.Session()
-    session.mount("https://", adapter)
-    
-    def __init__(self, username: str, password: str) -> None:
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        cookies_file: str = COOKIES_FILE,
+        nickname_cache_file: Optional[str] = None,
+        base_url: str = BASE_URL,
+    ) -> None:
         """
         初始化DCMS客户端。
         
         Args:
             username: 用户名
             password: 密码
+            cookies_file: cookies缓存文件，仅用于启动时恢复会话
+            nickname_cache_file: 可选，昵称缓存文件，重启后无需重新查询
+            base_url: API地址，测试时可指向本地的模拟服务器
         """
         self.username = username
         self.password = password
-        self._last_message_id = 0
-        
-    def login(self) -> bool:
+        self.cookies_file = cookies_file
+        self.base_url = base_url
+        self._last_message_id = 0  # 留言板的读取游标
+        self._listing = RoomListing()
+        self._cursors = {}  # 聊天室ID -> 读取游标
+        self._cursor_locks = {}  # 聊天室ID -> 保护该聊天室游标的锁
+        self._cursor_locks_guard = threading.Lock()
+        self._echoes = EchoFilter()
+        self._executor = None  # 批量查询昵称的线程池，首次需要时创建
+        self._executor_lock = threading.Lock()
+
+        # 所有请求共用一个会话：cookies 保存在内存中，连接池复用长连接
+        adapter = HTTPAdapter(
+            max_retries=self.retry_strategy,
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._auth_lock = threading.Lock()
+        self._auth_generation = 0  # 每次重新登录后递增，避免多个线程重复登录
+
+        cookies = load_cookies(self.cookies_file)
+        if cookies:
+            self.session.cookies.update(cookies)
+
+        self.nicknames = NicknameCache(path=nickname_cache_file)
+
+    def close(self) -> None:
+        """关闭昵称查询线程池和连接池。"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self.session.close()
+
+    def login(self, force: bool = False, room_ids: Optional[Iterable[int]] = None) -> bool:
         """
-        登录DCMS系统。
+        登录DCMS系统，并把各聊天室的读取游标定位到最新消息。
+
+        若缓存的cookies仍然有效则直接复用，不再重新登录。
+
+        Args:
+            force: 是否忽略缓存的cookies强制重新登录
+            room_ids: 可选，需要定位游标的聊天室，默认为 room_id
         Returns:
             bool: 登录是否成功
         """
-        url = f"{BASE_URL}api.php?action=login"
+        if not force and self._is_cookies_valid():
+            print("使用缓存的cookies")
+        elif not self._authenticate():
+            return False
+
+        for room_id in room_ids or [self.room_id]:
+            self._get_last_message_id_from_room(room_id)
+        print("登录成功")
+        return True
+
+    def _authenticate(self) -> bool:
+        """使用用户名和密码登录，并把新的cookies写入缓存文件。"""
+        url = f"{self.base_url}api.php?action=login"
         data = {"nick": self.username, "password": self.password}
-        
-        response = requests.post(url=url, data=data, timeout=5)
-        cookies = requests.utils.dict_from_cookiejar(response.cookies)
-        
+
+        self.session.cookies.clear()
+        response = self.session.post(url=url, data=data, timeout=5)
+
         data = response.json()
         if data["status"] != "success":
             print(f"登录失败: {data['message']}")
             return False
-            
-        with open("cookies.json", "w") as f:
-            json.dump(cookies, f)
-        
-        self._get_last_message_id_from_room()
-        print("登录成功")
+
+        self._auth_generation += 1
+        self._save_cookies()
         return True
 
-    def _load_cookies(self) -> Optional[Dict[str, str]]:
-        """加载cookies文件。"""
-        try:
-            with open("cookies.json") as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print("未找到cookies文件")
-            return None
+    def _save_cookies(self) -> None:
+        """将内存中的cookies写入缓存文件。"""
+        save_cookies(self.cookies_file, requests.utils.dict_from_cookiejar(self.session.cookies))
 
     def _is_cookies_valid(self) -> bool:
         """验证cookies是否有效。"""
-        cookies = self._load_cookies()
-        if not cookies:
+        if not self.session.cookies:
             return False
-            
-        response = requests.post(f"{BASE_URL}api.php", cookies=cookies,timeout=5)
+
+        response = self.session.post(f"{self.base_url}api.php", timeout=5)
         return response.json().get("status") == "success"
 
     def refresh_cookies(self) -> None:
         """刷新无效的cookies。"""
         if not self._is_cookies_valid():
-            self.login()
+            self._authenticate()
+
+    def _reauthenticate(self, generation: int) -> bool:
+        """
+        请求返回错误后按需重新登录。
+
+        Args:
+            generation: 发出请求时的登录代数
+
+        Returns:
+            bool: 是否已获得新的会话，调用方可以重试请求
+        """
+        with self._auth_lock:
+            if self._auth_generation != generation:
+                # 其他线程已经重新登录过了
+                return True
+            if self._is_cookies_valid():
+                # 会话仍然有效，说明错误与认证无关
+                return False
+            return self._authenticate()
+
+    def _request(
+        self,
+        method: str,
+        action: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        调用API接口，遇到认证错误时重新登录并重试一次。
+
+        Args:
+            method: HTTP方法
+            action: API动作名
+            params: 附加的查询参数
+            data: POST表单数据
+
+        Returns:
+            Dict 接口返回的JSON，失败时返回None
+        """
+        url = f"{self.base_url}api.php"
+        query = {"action": action, **(params or {})}
+
+        for attempt in range(2):
+            generation = self._auth_generation
+            response = self.session.request(method, url, params=query, data=data, timeout=5)
+            if not response.text.startswith('{"status":"error"'):
+                return response.json()
+            if attempt or not self._reauthenticate(generation):
+                break
+
+        print(f"错误: {response.text}")
+        return None
 
     def post_message(self, message: str, platform: str = "", name: str = "") -> None:
         """
@@ -95,29 +570,12 @@ class DCMS:
         if platform and name:
             message = f"[{platform}] {name}: {message}"
             
-        self.refresh_cookies()
-        url = f"{BASE_URL}api.php?action=guest-msg-add"
-        response = requests.post(
-            url=url,
-            cookies=self._load_cookies(),
-            data={"msg": message},
-            timeout = 5
-        )
-        
-        if response.text.startswith('{"status":"error"'):
-            print(f"错误: {response.text}")
+        self._request("post", "guest-msg-add", data={"msg": message})
 
     def get_message_board(self) -> Optional[List[Dict[str, Any]]]:
         """获取留言板消息。"""
-        self.refresh_cookies()
-        url = f"{BASE_URL}api.php?action=guest-msg-list&page=1"
-        response = requests.get(url=url, cookies=self._load_cookies(),timeout=5)
-        
-        if response.text.startswith('{"status":"error"'):
-            print(f"错误: {response.text}")
-            return None
-            
-        return response.json().get("data", [])
+        data = self._request("get", "guest-msg-list", {"page": 1})
+        return data.get("data", []) if data is not None else None
 
     def get_new_messages(self) -> List[Dict[str, Any]]:
         """
@@ -144,7 +602,7 @@ class DCMS:
         if messages:
             self._last_message_id = messages[0]['id']
 
-    def post_message_room(self, message: str, platform: str = "", name: str = "") -> None:
+    def post_message_room(self, message: str, platform: str = "", name: str = "", room_id: Optional[int] = None) -> None:
         """
         发送消息到聊天室。
 
@@ -152,62 +610,93 @@ class DCMS:
             message: 消息内容
             platform: 可选，平台标识
             name: 可选，发送者名称
+            room_id: 可选，目标聊天室，默认为 room_id
         """
 
         if platform and name:
             message = f"[{platform}] {name}: {message}"
 
-        self.refresh_cookies()
-        url = f"{BASE_URL}api.php?action=chat-msg-add&room={self.room_id}"
-        #print(url)
-        response = requests.post(
-            url=url,
-            cookies=self._load_cookies(),
-            data={"msg": message},
-            timeout=5
-        )
-
-        if response.text.startswith('{"status":"error"'):
-            print(f"错误: {response.text}")
-        else:
-            self._last_message_id = int(response.json()["id"])
+        room_id = room_id or self.room_id
+        data = self._request("post", "chat-msg-add", {"room": room_id}, {"msg": message})
+        if data is not None:
+            # 只记录自己发送的ID，不移动读取游标，否则会跳过其他人在此之前发送的消息
+            self._echoes.add(int(data["id"]))
 
-    def get_message_room(self) -> Optional[List[Dict[str, Any]]]:
-        """获取聊天室消息。"""
-        self.refresh_cookies()
-        url = f"{BASE_URL}api.php?action=chat-msg-list&room={self.room_id}&page=1"
-        #print(url)
-        response = requests.get(url=url, cookies=self._load_cookies(),timeout=5)
+    def get_message_room(
+        self,
+        page: int = 1,
+        since_id: Optional[int] = None,
+        room_id: Optional[int] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        获取聊天室消息，按ID从新到旧排列。
 
-        if response.text.startswith('{"status":"error"'):
-            print(f"错误: {response.text}")
+        Args:
+            page: 页码
+            since_id: 可选，只需要ID大于该值的消息；服务端不支持时自动停用
+            room_id: 可选，聊天室ID，默认为 room_id
+        """
+        params = self._listing.params(room_id or self.room_id, page, since_id)
+        data = self._request("get", "chat-msg-list", params)
+        if data is None:
             return None
 
-        return response.json().get("data", [])
+        messages = data.get("data", [])
+        self._listing.observe(params, messages)
+        return messages
 
-    def get_new_messages_from_room(self) -> List[Dict[str, Any]]:
+    def _cursor_lock(self, room_id: int) -> threading.Lock:
+        """返回保护指定聊天室读取游标的锁。"""
+        with self._cursor_locks_guard:
+            return self._cursor_locks.setdefault(room_id, threading.Lock())
+
+    def get_new_messages_from_room(
+        self,
+        include_own: bool = False,
+        room_id: Optional[int] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
         """
         获取自上次检查以来的聊天室新消息。
 
+        第一页没有追上上次读到的位置时继续向后翻页，避免两次轮询之间
+        的消息超过一页时丢失。可以与 post_message_room 在不同线程中并发调用，
+        不同聊天室的轮询互不影响。
+
+        Args:
+            include_own: 是否包含本客户端自己发送的消息
+            room_id: 可选，聊天室ID，默认为 room_id
+
         Returns:
-            List 新消息的列表
+            List 新消息的列表（从旧到新），请求失败时返回None
         """
-        new_messages = []
-        messages = self.get_message_room()
+        room_id = room_id or self.room_id
+        with self._cursor_lock(room_id):
+            messages = self._sync_room(room_id)
+        if messages is None or include_own:
+            return messages
+        return self._echoes.filter(messages)
 
-        for message in messages:
-            if message['id'] > self._last_message_id:
-                self._last_message_id = message['id']
-                new_messages.append(message)
+    def _sync_room(self, room_id: int) -> Optional[List[Dict[str, Any]]]:
+        """从读取游标开始同步聊天室消息并移动游标，调用方需持有该聊天室的游标锁。"""
+        sync = RoomSync(room_id, self._cursors.get(room_id, 0), self.max_sync_pages)
+        page = sync.page
+        while page:
+            messages = self.get_message_room(page, since_id=sync.cursor, room_id=room_id)
+            if messages is None:
+                # 翻页中途失败时不移动游标，下次轮询重新同步
+                return None
+            page = sync.feed(messages, self._listing.page_size)
 
-        new_messages.reverse()
-        return new_messages
+        self._cursors[room_id], messages = sync.result()
+        return messages
 
-    def _get_last_message_id_from_room(self) -> None:
+    def _get_last_message_id_from_room(self, room_id: Optional[int] = None) -> None:
         """获取最后一条消息的ID。"""
-        messages = self.get_message_room()
+        room_id = room_id or self.room_id
+        messages = self.get_message_room(room_id=room_id)
         if messages:
-            self._last_message_id = messages[0]['id']
+            with self._cursor_lock(room_id):
+                self._cursors[room_id] = messages[0]['id']
 
     def get_user_info(self, user_id: int) -> Optional[Dict[str, Any]]:
         """
@@ -219,19 +708,11 @@ class DCMS:
         Returns:
             Dict 包含用户信息的字典，失败时返回None
         """
-        self.refresh_cookies()
-        url = f"{BASE_URL}api.php?action=user-info&id={user_id}"
-        response = requests.get(url=url, cookies=self._load_cookies(),timeout=5)
-        
-        if response.text.startswith('{"status":"error"'):
-            print(f"错误: {response.text}")
-            return None
-            
-        return response.json()
+        return self._request("get", "user-info", {"id": user_id})
 
     def get_user_nickname(self, user_id: int) -> Optional[str]:
         """
-        获取用户昵称。
+        获取用户昵称，优先使用缓存。
         
         Args:
             user_id: 用户ID
@@ -239,5 +720,37 @@ class DCMS:
         Returns:
             str: 用户昵称，获取失败时返回None
         """
+        nick = self.nicknames.get(user_id)
+        if nick is not None:
+            return nick
+
         user_info = self.get_user_info(user_id)
-        return user_info['data']['nick'] if user_info else None
+        if not user_info:
+            return None
+        nick = user_info['data']['nick']
+        self.nicknames.put(user_id, nick)
+        return nick
+
+    def prefetch_user_nicknames(self, user_ids: Iterable[int]) -> None:
+        """
+        并发查询一批用户中尚未缓存的昵称，每个用户只查询一次。
+
+        Args:
+            user_ids: 用户ID，可以有重复
+        """
+        missing = [user_id for user_id in dict.fromkeys(user_ids) if self.nicknames.get(user_id) is None]
+        if not missing:
+            return
+
+        if len(missing) == 1:
+            self.get_user_nickname(missing[0])
+        else:
+            list(self._nickname_executor().map(self.get_user_nickname, missing))
+        self.nicknames.save()
+
+    def _nickname_executor(self) -> ThreadPoolExecutor:
+        """返回查询昵称用的线程池，与连接池同样大小，整个客户端共用一个。"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="DCMS-nick")
+            return self._executor
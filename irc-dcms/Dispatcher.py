@@ -0,0 +1,64 @@
+from typing import Any, Callable, Hashable
+import logging
+import queue
+import threading
+
+
+class RelayDispatcher:
+    """
+    转发任务分发器，把耗时的网络调用交给后台工作线程执行。
+
+    同一个目标（key）的任务总是交给同一个工作线程，因此按提交顺序执行；
+    不同目标之间互不阻塞。submit() 从不阻塞调用方，队列已满时丢弃任务。
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 1000) -> None:
+        """
+        Args:
+            workers: 工作线程数
+            max_queue: 每个工作线程的最大排队任务数
+        """
+        self._queues = [queue.Queue(maxsize=max_queue) for _ in range(workers)]
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "dropped": 0}
+        for index, tasks in enumerate(self._queues):
+            threading.Thread(target=self._run, args=(tasks,), name=f"Relay-Worker-{index}", daemon=True).start()
+
+    def submit(self, key: Hashable, func: Callable[..., Any], *args: Any, **kwargs: Any) -> bool:
+        """
+        提交一个任务。
+
+        Args:
+            key: 目标标识，同一目标的任务按顺序执行
+            func: 要执行的函数
+
+        Returns:
+            bool: 是否成功入队
+        """
+        tasks = self._queues[hash(key) % len(self._queues)]
+        try:
+            tasks.put_nowait((func, args, kwargs))
+        except queue.Full:
+            self._count("dropped")
+            logging.warning(f"[Dispatcher] Queue for {key} is full, dropping task")
+            return False
+        self._count("submitted")
+        return True
+
+    def depth(self) -> int:
+        """当前排队中的任务总数。"""
+        return sum(tasks.qsize() for tasks in self._queues)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _run(self, tasks: "queue.Queue") -> None:
+        while True:
+            func, args, kwargs = tasks.get()
+            try:
+                func(*args, **kwargs)
+                self._count("completed")
+            except Exception as e:
+                self._count("failed")
+                logging.error(f"[Dispatcher] Task {getattr(func, '__name__', func)} failed: {e}")
@@ -0,0 +1,286 @@
+"""
+本地模拟的 DCMS api.php，用于在不访问 https://3g.cx/ 的情况下测试和压测 DCMS 客户端。
+
+支持客户端用到的接口：login、会话校验、chat-msg-add、chat-msg-list、
+user-info、guest-msg-add、guest-msg-list。可以配置响应延迟、错误注入、
+会话过期以及按固定速率自动产生聊天消息。
+
+单独运行时在本地启动一个服务器：
+    python FakeDCMS.py --port 8080 --rate 5
+然后把客户端的 base_url 指向 http://127.0.0.1:8080/ 即可。
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+import argparse
+import itertools
+import json
+import random
+import secrets
+import threading
+import time
+
+
+class FakeDCMSServer:
+    """内存中的 DCMS 模拟服务器。"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        session_ttl: Optional[float] = None,
+        page_size: int = 20,
+        support_since: bool = True,
+        rooms: Optional[List[int]] = None,
+        users: int = 10,
+    ) -> None:
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示自动分配
+            latency: 每个请求的固定延迟（秒）
+            jitter: 在固定延迟上附加的随机延迟上限（秒）
+            error_rate: 请求返回错误的概率，一半为 HTTP 500，一半为 {"status":"error"}
+            session_ttl: 可选，会话有效期（秒），用于测试重新登录
+            page_size: chat-msg-list 每页消息数
+            support_since: 是否支持 chat-msg-list 的 since 参数
+            rooms: 自动产生消息的聊天室
+            users: 自动产生消息时使用的模拟用户数
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        self.page_size = page_size
+        self.support_since = support_since
+        self.rooms = rooms or [34]
+        self.users = {user_id: f"user{user_id}" for user_id in range(1, users + 1)}
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._sessions: Dict[str, Any] = {}  # session id -> (user id, 登录时间)
+        self._room_messages: Dict[int, List[Dict[str, Any]]] = {}
+        self._board_messages: List[Dict[str, Any]] = []
+        self.created_at: Dict[int, float] = {}  # 消息ID -> 产生时间（time.perf_counter）
+        self.requests: Dict[str, int] = {}  # 各接口的请求次数
+        self.generated = 0  # 自动产生的消息数
+        self._generator = None
+        self._stop = threading.Event()
+
+        server = self
+        class Handler(_Handler):
+            fake = server
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "FakeDCMSServer":
+        threading.Thread(target=self.httpd.serve_forever, name="FakeDCMS", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def add_user(self, nick: str) -> int:
+        """注册一个用户（用于登录），返回用户ID。"""
+        with self._lock:
+            for user_id, existing in self.users.items():
+                if existing == nick:
+                    return user_id
+            user_id = max(self.users, default=0) + 1
+            self.users[user_id] = nick
+            return user_id
+
+    def add_room_message(self, room_id: int, user_id: int, msg: str) -> int:
+        """直接向聊天室写入一条消息，返回消息ID。"""
+        with self._lock:
+            message_id = next(self._ids)
+            self._room_messages.setdefault(room_id, []).append(
+                {"id": message_id, "id_user": user_id, "msg": msg, "time": int(time.time())}
+            )
+            self.created_at[message_id] = time.perf_counter()
+        return message_id
+
+    def generate_messages(self, rate: float, text: str = "load test") -> None:
+        """
+        以每秒 rate 条的速率向各聊天室随机产生消息，消息内容带有 #ID 标记便于统计延迟。
+        """
+        def run():
+            while not self._stop.wait(random.expovariate(rate)):
+                room_id = random.choice(self.rooms)
+                user_id = random.choice(list(self.users))
+                with self._lock:
+                    message_id = next(self._ids)
+                    self._room_messages.setdefault(room_id, []).append(
+                        {"id": message_id, "id_user": user_id, "msg": f"{text} #{message_id}", "time": int(time.time())}
+                    )
+                    self.created_at[message_id] = time.perf_counter()
+                    self.generated += 1
+        self._generator = threading.Thread(target=run, name="FakeDCMS-Generator", daemon=True)
+        self._generator.start()
+
+    def room_messages(self, room_id: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._room_messages.get(room_id, []))
+
+    # 以下为请求处理
+
+    def handle(self, method: str, query: Dict[str, str], form: Dict[str, str], cookies: Dict[str, str]):
+        """处理一次 api.php 请求，返回 (HTTP状态码, 响应内容, 需要设置的cookies)。"""
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+        action = query.get("action", "")
+        with self._lock:
+            self.requests[action or "session"] = self.requests.get(action or "session", 0) + 1
+
+        if self.error_rate and random.random() < self.error_rate:
+            if random.random() < 0.5:
+                return 500, {"status": "error", "message": "injected server error"}, None
+            return 200, {"status": "error", "message": "injected error"}, None
+
+        if action == "login":
+            return self._login(form)
+
+        user_id = self._session_user(cookies.get("PHPSESSID"))
+        if user_id is None:
+            return 200, {"status": "error", "message": "not logged in"}, None
+        if not action:
+            return 200, {"status": "success"}, None
+
+        if action == "chat-msg-add":
+            room_id = int(query.get("room", 0))
+            message_id = self.add_room_message(room_id, user_id, form.get("msg", ""))
+            return 200, {"status": "success", "id": str(message_id)}, None
+        if action == "chat-msg-list":
+            return 200, self._list_room(query), None
+        if action == "user-info":
+            target = int(query.get("id", 0))
+            if target not in self.users:
+                return 200, {"status": "error", "message": "no such user"}, None
+            return 200, {"status": "success", "data": {"id": target, "nick": self.users[target]}}, None
+        if action == "guest-msg-add":
+            with self._lock:
+                message_id = next(self._ids)
+                self._board_messages.append({"id": message_id, "id_user": user_id, "msg": form.get("msg", "")})
+            return 200, {"status": "success", "id": str(message_id)}, None
+        if action == "guest-msg-list":
+            with self._lock:
+                messages = list(reversed(self._board_messages))[:self.page_size]
+            return 200, {"status": "success", "data": messages}, None
+        return 200, {"status": "error", "message": f"unknown action {action}"}, None
+
+    def _login(self, form: Dict[str, str]):
+        nick = form.get("nick", "")
+        if not nick:
+            return 200, {"status": "error", "message": "empty nick"}, None
+        user_id = self.add_user(nick)
+        session_id = secrets.token_hex(16)
+        with self._lock:
+            self._sessions[session_id] = (user_id, time.monotonic())
+        return 200, {"status": "success"}, {"PHPSESSID": session_id}
+
+    def _session_user(self, session_id: Optional[str]) -> Optional[int]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            user_id, started = session
+            if self.session_ttl is not None and time.monotonic() - started > self.session_ttl:
+                del self._sessions[session_id]
+                return None
+            return user_id
+
+    def _list_room(self, query: Dict[str, str]) -> Dict[str, Any]:
+        room_id = int(query.get("room", 0))
+        page = max(int(query.get("page", 1)), 1)
+        with self._lock:
+            messages = list(reversed(self._room_messages.get(room_id, [])))
+        if self.support_since and query.get("since"):
+            since = int(query["since"])
+            messages = [message for message in messages if message["id"] > since]
+        start = (page - 1) * self.page_size
+        return {"status": "success", "data": messages[start:start + self.page_size]}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake: FakeDCMSServer = None
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，与真实服务器一致
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _serve(self, method: str) -> None:
+        url = urlparse(self.path)
+        if url.path != "/api.php":
+            self.send_error(404)
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        form = {}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = self.rfile.read(length).decode("utf-8")
+            form = {key: values[-1] for key, values in parse_qs(body).items()}
+        cookies = {}
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            if "=" in part:
+                key, value = part.strip().split("=", 1)
+                cookies[key] = value
+
+        status, payload, set_cookies = self.fake.handle(method, query, form, cookies)
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (set_cookies or {}).items():
+            self.send_header("Set-Cookie", f"{key}={value}; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self._serve("GET")
+
+    def do_POST(self) -> None:
+        self._serve("POST")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地模拟的 DCMS API 服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="附加的随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="请求返回错误的概率")
+    parser.add_argument("--session-ttl", type=float, default=None, help="会话有效期（秒）")
+    parser.add_argument("--rate", type=float, default=0.0, help="每秒自动产生的聊天消息数")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[34], help="自动产生消息的聊天室")
+    parser.add_argument("--no-since", action="store_true", help="不支持 since 参数")
+    args = parser.parse_args()
+
+    server = FakeDCMSServer(
+        args.host, args.port, args.latency, args.jitter, args.error_rate,
+        args.session_ttl, support_since=not args.no_since, rooms=args.rooms,
+    ).start()
+    if args.rate:
+        server.generate_messages(args.rate)
+    print(f"FakeDCMS listening on {server.base_url}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,39 @@
-import queue
-from typing import Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+import heapq
 import logging
 import os
 import re
-import threading
+import sys
 import time
 from irc.bot import SingleServerIRCBot
+import irc.connection
 from logging.handlers import TimedRotatingFileHandler
 import DCMS
+from Dispatcher import RelayDispatcher
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from irc_encoder import IRCEncoder
+from irc_scheduler import IRCSendScheduler, PRIORITY_COMMAND
+from relay_hub import RelayHub
+from supervisor import Supervisor
+import tls
 
 # 机器人配置
 IRC_CONFIG = {
     "server": "irc.freenode.net",
     "port": 6667,
+    "ssl": False,  # 为True时使用 TLS 连接（通常端口为 6697）
     "nickname": "ircdcms_bridge",
-    "channel": "#dcms"
+    "rooms": {  # IRC 频道 -> DCMS 聊天室ID，所有映射共用一个 IRC 连接和一个 DCMS 会话
+        "#dcms": 34,
+    },
+    "coalesce_window": 0.5,  # 合并发往DCMS的消息的时间窗口（秒），0 表示逐条发送
+    "hub_room": 34,  # 中继模式下与其他平台互通的 DCMS 聊天室，其他映射仍只在 IRC 和 DCMS 之间转发
 }
 
+# 其他桥接在 IRC 中使用的昵称，中继模式下不再转发它们的消息
+BRIDGE_NICKS = ("qqirc_bridge", "ircxmpp_bridge")
+
 
 def setup_logging() -> None:
     """配置日志系统，包括文件和控制台输出"""
@@ -43,47 +60,84 @@ class MyIRCBot(SingleServerIRCBot):
     
     负责处理 IRC 事件并与 DCMS 系统交互，实现消息的双向转发。
     """
-    def __init__(self, server, port, nickname, channel, dcms: DCMS):
-        super().__init__([(server, port)], nickname, nickname)
-        self.channel = channel
+    def __init__(self, server, port, nickname, rooms: Dict[str, int], dcms: DCMS, dispatcher: RelayDispatcher,
+                 scheduler: IRCSendScheduler, poster: Optional[DCMS.PostCoalescer] = None, use_ssl: bool = False,
+                 supervisor: Optional[Supervisor] = None, hub: Optional[RelayHub] = None):
+        # TLS 连接使用共用的 SSLContext，断线重连时恢复 TLS 会话
+        self.connect_factory = tls.irc_connect_factory(server) if use_ssl else irc.connection.Factory()
+        super().__init__([(server, port)], nickname, nickname, connect_factory=self.connect_factory)
+        self.rooms = {channel.lower(): room_id for channel, room_id in rooms.items()}
+        self.room_channels: Dict[int, List[str]] = {}  # DCMS 聊天室ID -> IRC 频道
+        for channel, room_id in self.rooms.items():
+            self.room_channels.setdefault(room_id, []).append(channel)
         self.dcms = dcms
+        self.dispatcher = dispatcher
+        self.poster = poster
+        self.supervisor = supervisor
+        # 中继模式：hub_room 的消息经过进程内的中继中心与其他平台互通，不再经过 IRC 中转
+        self.hub = hub
+        self.hub_room = IRC_CONFIG["hub_room"]
         self.nickname = nickname
-        self.message_queue = queue.Queue()
         self.connected = False
+        # 所有发往 IRC 的消息都经过限速队列，断线期间的消息留在队列中
+        self.scheduler = scheduler
+        self.scheduler.bind(self.connection.privmsg, lambda: self.connected, self.on_send_error)
 
     def on_welcome(self, connection, event):
         logging.info(f"Connected to {self.connection.server}")
         self.connected = True
-        connection.join(self.channel)
+        self.join_channels(connection)
 
         # 补发之前未成功发送的消息
-        while not self.message_queue.empty():
-            msg = self.message_queue.get()
-            try:
-                self.connection.privmsg(self.channel, msg)
-                logging.info(f"[IRC - resend] {msg}")
-            except Exception as e:
-                logging.warning(f"Failed to resend message: {msg}, {e}")
-                self.message_queue.put(msg)
-                break  # 连接可能又失效了，停止重发
+        self.scheduler.wake()
+
+    def on_send_error(self, error):
+        logging.warning(f"Send failed, queued messages will be resent after reconnect: {error}")
+        self.connected = False
+
+    def join_channels(self, connection):
+        for channel in self.rooms:
+            connection.join(channel)
 
     def on_join(self, connection, event):
         nick = event.source.nick  # 获取加入者的昵称
-        logging.info(f"{nick} joined channel {self.channel}")
+        logging.info(f"{nick} joined channel {event.target}")
 
     def on_pubmsg(self, connection, event):
         message = event.arguments[0]
         nick = event.source.nick
+        channel = event.target.lower()
+        room_id = self.rooms.get(channel)
+        if room_id is None:
+            return
 
         # 不转发以分号和感叹号开头的消息
         if message.startswith(';') or message.startswith('!'):
             if message.startswith("!ircdcms"):  # 只处理自己的命令
                 cmd = message[8:].strip()
                 if cmd == "status":
-                    self.connection.privmsg(self.channel, ";IRCDCMSBot: Connected to DCMS bridge")
+                    status = (
+                        f";IRCDCMSBot: Connected to DCMS bridge | Queued: {self.queued()}"
+                        f" | IRC queue: {self.scheduler.depth()}"
+                    )
+                    if self.poster:
+                        stats = self.poster.get_stats()
+                        status += f" | Coalesced: {stats['lines']} lines in {stats['posts']} posts"
+                    if self.supervisor:
+                        status += f" | Restarts: {self.supervisor.summary()}"
+                    if self.hub:
+                        status += f" | Hub: {self.hub.summary()}"
+                    self.scheduler.submit(channel, status, PRIORITY_COMMAND)
                 logging.info(f"[IRC] {nick}: {message}")
             return
 
+        if self.hub is not None and room_id == self.hub_room:
+            # 其他平台的消息已由中继中心直接转发，只发布 IRC 用户自己的消息
+            if not nick.startswith(BRIDGE_NICKS) and not message.startswith("?"):
+                logging.info(f"[IRC] {nick}: {message}")
+                self.hub.publish("irc", "IRC", nick, message)
+            return
+
         if nick.startswith("qqirc_bridge"):
 
             if message.startswith("[QQ]"):
@@ -93,7 +147,7 @@ class MyIRCBot(SingleServerIRCBot):
                     logging.info(f"{message}")
                 else:
                     logging.info(f"{message}")
-                    self.dcms.post_message_room(message)
+                    self.relay_to_dcms(room_id, message)
             else:
                 logging.info(f"[QQ-IRCBOT] {message}")
         elif nick.startswith("ircxmpp_bridge"):
@@ -104,49 +158,83 @@ class MyIRCBot(SingleServerIRCBot):
                     logging.info(f"{message}")
                 else:
                     logging.info(f"{message}")
-                    self.dcms.post_message_room(message)
+                    self.relay_to_dcms(room_id, message)
         else:
             if message.startswith("!") or message.startswith("?"):
                 logging.info(f"[IRC] {nick}: {message}")
             else:
                 logging.info(f"[IRC] {nick}: {message}")
-                self.dcms.post_message_room(message,"IRC",nick)
-
-    def send_message_to_irc(self, message):
-        if self.connected:
-            try:
-                self.connection.privmsg(self.channel, message)
-            except Exception as e:
-                logging.warning(f"Send failed, queuing: {message}")
-                self.connected = False
-                self.message_queue.put(message)
+                self.relay_to_dcms(room_id, message, "IRC", nick)
+
+    def relay_to_dcms(self, room_id, message, platform="", name=""):
+        """
+        转发消息到DCMS聊天室。
+
+        在 IRC 事件线程中只做入队，HTTP 请求由合并线程或分发器的工作线程完成，
+        避免慢请求阻塞 IRC 连接。
+        """
+        if self.poster:
+            self.poster.add(message, platform, name, room_id=room_id)
         else:
+            self.dispatcher.submit(f"dcms:{room_id}", self.dcms.post_message_room, message, platform, name, room_id)
+
+    def queued(self):
+        """等待合并和等待发送到 DCMS 的消息数"""
+        return self.dispatcher.depth() + (self.poster.depth() if self.poster else 0)
+
+    def send_message_to_irc(self, message, room_id=None):
+        """发送消息到与 DCMS 聊天室对应的所有频道，未指定聊天室时发送到所有频道"""
+        if not self.connected:
             logging.info(f"[Queueing] IRC not connected. Queued: {message}")
-            self.message_queue.put(message)
+        channels = self.room_channels.get(room_id, []) if room_id is not None else list(self.rooms)
+        for channel in channels:
+            self.scheduler.submit(channel, message)
 
     def on_disconnect(self, connection, event):
         logging.warning("Disconnected from server.")
         self.connected = False
-        self.connection.connect(server=self.connection.server, port=self.connection.port, nickname=self.nickname)
+        self.connection.connect(server=self.connection.server, port=self.connection.port, nickname=self.nickname,
+                                connect_factory=self.connect_factory)
         logging.info(f"Connected to {self.connection.server}")
         self.connected = True
-        connection.join(self.channel)
+        self.join_channels(connection)
+
+    def run(self):
+        """
+        连接服务器并处理 IRC 事件。连接失败或事件处理出错时抛出异常，
+        由 Supervisor 按退避间隔再次调用，机器人对象和发送队列保持不变。
+        """
+        if not self.connection.is_connected():
+            server = self.servers.peek()
+            self.connection.connect(server.host, server.port, self.nickname, connect_factory=self.connect_factory)
+        self.reactor.process_forever()
 
     def on_kick(self, connection, event):
         target = event.arguments[0]
         if target == self.connection.get_nickname():
             logging.warning("Bot was kicked from the channel. Rejoining in 10 seconds...")
-            connection.join(self.channel)
-            logging.info(f"Connected to {self.connection.server} {self.channel}")
+            connection.join(event.target)
+            logging.info(f"Connected to {self.connection.server} {event.target}")
             self.connected = True
 
 
 def poll_api_forever(dcms, irc_bot: MyIRCBot):
+    """在一个线程中轮询所有映射的聊天室，每个聊天室按各自的活跃程度调整间隔"""
+    intervals = {room_id: DCMS.AdaptiveInterval() for room_id in irc_bot.room_channels}
+    due = [(time.monotonic(), room_id) for room_id in intervals]
+    # 中继模式下 hub_room 的消息发布到中继中心；LoadTest 等替代的机器人没有这两个属性
+    hub = getattr(irc_bot, "hub", None)
+    hub_room = getattr(irc_bot, "hub_room", None)
+    heapq.heapify(due)
     while True:
+        due_at, room_id = heapq.heappop(due)
+        time.sleep(max(0, due_at - time.monotonic()))
+        result = None
         try:
-            result = dcms.get_new_messages_from_room()
+            result = dcms.get_new_messages_from_room(room_id=room_id)
             # Compare
             if result is not None:
+                dcms.prefetch_user_nicknames(message['id_user'] for message in result)
                 for message in result:
                     #print(message['id_user'])
                     nick = dcms.get_user_nickname(message['id_user'])
@@ -155,33 +243,55 @@ def poll_api_forever(dcms, irc_bot: MyIRCBot):
                     if nick != dcms.username:
 
                         logging.info("[DCMS] "+nick+": "+re.sub(r'[\r\n]+', ' ', message['msg']))
-                        irc_bot.send_message_to_irc("[DCMS] "+nick+": "+re.sub(r'[\r\n]+', ' ', message['msg']))
+                        if hub is not None and room_id == hub_room:
+                            hub.publish("dcms", "DCMS", nick, re.sub(r'[\r\n]+', ' ', message['msg']))
+                        else:
+                            irc_bot.send_message_to_irc("[DCMS] "+nick+": "+re.sub(r'[\r\n]+', ' ', message['msg']), room_id)
         except TimeoutError as e:
             logging.error("[DCMSAPI] Timeout error.")
         except Exception as e:
             logging.error(f"[API Polling Error] {e}")
-        time.sleep(5)
+        heapq.heappush(due, (time.monotonic() + intervals[room_id].next(bool(result)), room_id))
 
-def run_bot_forever():
-
-    dcms = DCMS.DCMS("dcmsirc_bot", "password")
-    dcms.login()
+def build_bot(supervisor: Supervisor, hub: Optional[RelayHub] = None) -> MyIRCBot:
+    """登录 DCMS 并创建 IRC 机器人，尚未连接"""
+    dcms = DCMS.DCMS("dcmsirc_bot", "password", nickname_cache_file="nicknames.json")
+    dcms.login(room_ids=set(IRC_CONFIG["rooms"].values()))
     #logging.info(dcms.load_cookies())
+    dispatcher = RelayDispatcher()
+    # 合并后的消息同样经过分发器，按聊天室分配工作线程
+    poster = (DCMS.PostCoalescer(dcms, IRC_CONFIG["coalesce_window"], dispatcher=dispatcher)
+              if IRC_CONFIG["coalesce_window"] else None)
+    # 过长的 DCMS 消息按 512 字节限制拆分，积压时合并短消息
+    scheduler = IRCSendScheduler(encoder=IRCEncoder(IRC_CONFIG["nickname"]))
+    scheduler.start()
 
-    while True:
-        try:
-            logging.info("Starting IRC bot...")
-            bot = MyIRCBot(IRC_CONFIG["server"], IRC_CONFIG["port"], IRC_CONFIG["nickname"], IRC_CONFIG["channel"], dcms)
+    logging.info("Starting IRC bot...")
+    return MyIRCBot(IRC_CONFIG["server"], IRC_CONFIG["port"], IRC_CONFIG["nickname"], IRC_CONFIG["rooms"], dcms, dispatcher, scheduler, poster,
+                    use_ssl=IRC_CONFIG["ssl"], supervisor=supervisor, hub=hub)
 
+def run_bot_forever():
+    supervisor = Supervisor(initial_delay=15)
+    bot = build_bot(supervisor)
 
-            api_polling_thread = threading.Thread(target=poll_api_forever, args=(dcms, bot))
-            api_polling_thread.daemon = True  # 设置为守护线程，程序退出时自动结束
-            api_polling_thread.start()
+    # DCMS 轮询和 IRC 连接分别监督，其中一个出错时只重启它自己
+    supervisor.start("dcms-poller", poll_api_forever, bot.dcms, bot)
+    try:
+        supervisor.run("irc", bot.run)
+    finally:
+        bot.dcms.close()
 
-            bot.start()
-        except Exception as e:
-            logging.error(f"Bot crashed: {e}. Retrying in 15 seconds...", exc_info=True)
-            time.sleep(15)
+def attach_hub(hub: RelayHub, supervisor: Supervisor) -> MyIRCBot:
+    """
+    中继模式：把 IRC 和 DCMS 登记为中继中心的两个目的地，IRC 连接和 DCMS 轮询
+    在后台线程中由 supervisor 监督，立即返回。
+    """
+    bot = build_bot(supervisor, hub)
+    hub.register("irc", lambda message: bot.send_message_to_irc(message.format(), bot.hub_room))
+    hub.register("dcms", lambda message: bot.relay_to_dcms(bot.hub_room, message.text, message.platform, message.name))
+    supervisor.start("dcms-poller", poll_api_forever, bot.dcms, bot)
+    supervisor.start("irc", bot.run)
+    return bot
 
 if __name__ == "__main__":
     setup_logging()
@@ -0,0 +1,138 @@
+"""
+DCMS 转发压测工具。
+
+在本地启动 FakeDCMS，使用真实的 DCMS 客户端和 poll_api_forever 轮询，
+把转发到 IRC 的消息交给一个记录用的假 IRC 机器人，最后报告：
+- DCMS→IRC 的转发吞吐量和 p50/p99 延迟
+- IRC→DCMS 的发送行数与实际 chat-msg-add 请求数
+- 模拟服务器收到的各接口请求数
+
+示例：
+    python LoadTest.py --rate 20 --duration 30 --rooms 34 35 --latency 0.05
+"""
+
+from typing import Dict, List
+import argparse
+import logging
+import re
+import threading
+import time
+
+import DCMS
+import IRC
+from Dispatcher import RelayDispatcher
+from FakeDCMS import FakeDCMSServer
+
+MESSAGE_ID = re.compile(r"#(\d+)$")
+
+
+class RecordingIRCBot:
+    """代替 MyIRCBot，记录每条转发到 IRC 的消息到达的时间。"""
+
+    def __init__(self, server: FakeDCMSServer, rooms: List[int]) -> None:
+        self.server = server
+        self.room_channels = {room_id: [f"#room{room_id}"] for room_id in rooms}
+        self.latencies: List[float] = []
+        self.relayed = 0
+        self._lock = threading.Lock()
+
+    def send_message_to_irc(self, message: str, room_id: int = None) -> None:
+        now = time.perf_counter()
+        match = MESSAGE_ID.search(message)
+        with self._lock:
+            self.relayed += 1
+            if match and int(match.group(1)) in self.server.created_at:
+                self.latencies.append(now - self.server.created_at[int(match.group(1))])
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def run(args: argparse.Namespace) -> Dict[str, float]:
+    server = FakeDCMSServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        session_ttl=args.session_ttl,
+        support_since=not args.no_since,
+        rooms=args.rooms,
+    ).start()
+
+    dcms = DCMS.DCMS("dcmsirc_bot", "password", cookies_file=args.cookies_file, base_url=server.base_url)
+    dcms.login(room_ids=args.rooms)
+    bot = RecordingIRCBot(server, args.rooms)
+
+    # IRC→DCMS：模拟频道中的发言，经过与 MyIRCBot 相同的合并/分发路径
+    dispatcher = RelayDispatcher()
+    poster = DCMS.PostCoalescer(dcms, args.coalesce_window, dispatcher=dispatcher) if args.coalesce_window else None
+    posted = 0
+
+    server.generate_messages(args.rate)
+    threading.Thread(target=IRC.poll_api_forever, args=(dcms, bot), daemon=True).start()
+
+    started = time.perf_counter()
+    next_post = started
+    while time.perf_counter() - started < args.duration:
+        if args.post_rate and time.perf_counter() >= next_post:
+            room_id = args.rooms[posted % len(args.rooms)]
+            text = f"irc line {posted}"
+            if poster:
+                poster.add(text, "IRC", "loadtest", room_id=room_id)
+            else:
+                dispatcher.submit(f"dcms:{room_id}", dcms.post_message_room, text, "IRC", "loadtest", room_id)
+            posted += 1
+            next_post += 1 / args.post_rate
+        time.sleep(0.01)
+    # 给最后一批消息留出一个轮询周期
+    time.sleep(args.drain)
+    elapsed = time.perf_counter() - started
+    server.stop()
+    dcms.close()
+
+    report = {
+        "generated": server.generated,
+        "relayed": bot.relayed,
+        "throughput": bot.relayed / elapsed,
+        "p50": percentile(bot.latencies, 0.50),
+        "p99": percentile(bot.latencies, 0.99),
+        "max": max(bot.latencies, default=float("nan")),
+        "irc_lines": posted,
+        "dcms_posts": server.requests.get("chat-msg-add", 0),
+    }
+
+    print(f"Generated {report['generated']} DCMS messages, relayed {report['relayed']} to IRC "
+          f"({report['throughput']:.1f} msg/s)")
+    print(f"DCMS→IRC latency: p50={report['p50'] * 1000:.0f} ms  p99={report['p99'] * 1000:.0f} ms  "
+          f"max={report['max'] * 1000:.0f} ms")
+    if posted:
+        print(f"IRC→DCMS: {posted} lines sent in {report['dcms_posts']} chat-msg-add requests")
+    print("Requests: " + ", ".join(f"{action}={count}" for action, count in sorted(server.requests.items())))
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DCMS 转发压测")
+    parser.add_argument("--rate", type=float, default=10.0, help="DCMS 每秒产生的消息数")
+    parser.add_argument("--post-rate", type=float, default=0.0, help="IRC 每秒发往 DCMS 的行数")
+    parser.add_argument("--duration", type=float, default=20.0, help="压测时长（秒）")
+    parser.add_argument("--drain", type=float, default=12.0, help="结束后等待剩余消息的时间（秒）")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[34])
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟服务器的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="模拟服务器的随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟服务器返回错误的概率")
+    parser.add_argument("--session-ttl", type=float, default=None, help="模拟服务器的会话有效期（秒）")
+    parser.add_argument("--no-since", action="store_true", help="模拟服务器不支持 since 参数")
+    parser.add_argument("--coalesce-window", type=float, default=IRC.IRC_CONFIG["coalesce_window"])
+    parser.add_argument("--cookies-file", default="loadtest_cookies.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+比较 EmojiEngine 与 emojiswitch 的 emoji 转换耗时，并检查两者输出完全相同。
+
+用随机生成的群消息（中英文、emoji、:名称: 混合）和一组反复出现的昵称，
+分别测量 IRC→QQ 的 emojize(lang="en") 和 QQ→IRC 的 demojize(lang="zh")。
+
+示例：
+    python EmojiBenchmark.py --messages 2000 --repeat 5
+"""
+
+from typing import Callable, List
+import argparse
+import random
+import time
+
+import emojiswitch
+from emojiswitch import unicode_codes
+
+import EmojiEngine
+
+DELIMITERS = (":", ":")
+WORDS = ["hello", "ok", "今天", "吃饭了吗", "IRC", "转发", "测试", "哈哈哈", "the", "bridge", "12:30", "a:b"]
+
+
+def make_corpus(count: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    emojis = list(unicode_codes.LANG_EMOJI["en"].values())
+    names = list(unicode_codes.LANG_EMOJI["en"].keys())
+    lines = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(3, 30)):
+            roll = rng.random()
+            if roll < 0.1:
+                parts.append(rng.choice(emojis))
+            elif roll < 0.15:
+                parts.append(rng.choice(names))
+            else:
+                parts.append(rng.choice(WORDS))
+        lines.append(" ".join(parts))
+    return lines
+
+
+def measure(func: Callable[[str], str], lines: List[str], repeat: int) -> float:
+    """返回处理一遍 lines 的最短耗时（秒）。"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for line in lines:
+            func(line)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="emoji 转换性能对比")
+    parser.add_argument("--messages", type=int, default=2000, help="测试消息条数")
+    parser.add_argument("--nicknames", type=int, default=50, help="不同昵称的个数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最短耗时")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    lines = make_corpus(args.messages, args.seed)
+    nicknames = [name[:12] for name in make_corpus(args.nicknames, args.seed + 1)]
+    # 昵称随每条消息重复出现
+    rng = random.Random(args.seed)
+    senders = [rng.choice(nicknames) for _ in lines]
+
+    started = time.perf_counter()
+    EmojiEngine.prepare(DELIMITERS, "zh")
+    EmojiEngine.prepare(DELIMITERS, "en")
+    print(f"EmojiEngine build: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    cases = [
+        ("emojize en", lines,
+         lambda s: emojiswitch.emojize(s, delimiters=DELIMITERS, lang="en"),
+         lambda s: EmojiEngine.emojize(s, delimiters=DELIMITERS, lang="en")),
+        ("demojize zh", lines,
+         lambda s: emojiswitch.demojize(s, delimiters=DELIMITERS, lang="zh"),
+         lambda s: EmojiEngine.demojize(s, delimiters=DELIMITERS, lang="zh")),
+        # 不经过缓存，每条都重新转换
+        ("nickname", senders,
+         lambda s: emojiswitch.demojize(s, delimiters=DELIMITERS, lang="zh"),
+         lambda s: EmojiEngine.demojize(s, delimiters=DELIMITERS, lang="zh")),
+        # 预热后所有昵称都在缓存中，即稳定运行时的情况
+        ("nickname lru", senders,
+         lambda s: emojiswitch.demojize(s, delimiters=DELIMITERS, lang="zh"),
+         lambda s: EmojiEngine.demojize_name(s, DELIMITERS, "zh")),
+    ]
+    for name, inputs, old, new in cases:
+        mismatches = [line for line in inputs if old(line) != new(line)]
+        if mismatches:
+            raise SystemExit(f"{name}: {len(mismatches)} outputs differ, e.g. {mismatches[0]!r}")
+        old_time = measure(old, inputs, args.repeat)
+        new_time = measure(new, inputs, args.repeat)
+        print(f"{name:12} emojiswitch {old_time / len(inputs) * 1e6:8.1f} us/line  "
+              f"EmojiEngine {new_time / len(inputs) * 1e6:8.1f} us/line  ({old_time / new_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
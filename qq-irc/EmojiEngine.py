@@ -0,0 +1,140 @@
+"""
+预编译的 emoji 转换，输出与 emojiswitch 0.0.3 的 emojize/demojize 完全相同。
+
+emojiswitch 每次调用都要重新查找正则缓存、创建替换函数，demojize 使用的是
+约 3800 个 emoji 按长度排序拼成的多选正则，文本的每个位置都要逐个尝试。
+这里对每组 (delimiters, lang) 只构建一次：
+- demojize 先用字符集快速找到可能是 emoji 开头的位置，没有时直接返回；
+  在这些位置用按前缀合并的 trie 正则匹配，仍然取最长的 emoji，
+  替换结果预先算好放在字典中
+- emojize 的正则和替换表同样只构建一次
+- demojize_name() 带 LRU 缓存，用于反复出现的群昵称
+
+示例：
+    >>> emojize("Python is :thumbs_up:", lang="en")
+    'Python is 👍'
+    >>> demojize("你好👍", lang="zh")
+    '你好:竖起大拇指:'
+"""
+
+from typing import Dict, Pattern, Tuple
+import functools
+import re
+
+from emojiswitch import unicode_codes
+
+_DEFAULT_DELIMITER = ":"
+Delimiters = Tuple[str, str]
+
+
+def _trie_pattern(words) -> str:
+    """把一组字符串构建成 trie 形式的正则，匹配时在同一位置取最长的字符串。"""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}  # 结束标记
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in node.items() if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # 贪婪的可选分支：先尝试更长的 emoji，失败时回退到当前位置结束
+            return body + "?" if len(branches) == 1 and len(body) == 1 else "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+@functools.lru_cache(maxsize=None)
+def _emoji_regexp() -> Pattern:
+    return re.compile(_trie_pattern(unicode_codes.LANG_EMOJI["en"].values()))
+
+
+@functools.lru_cache(maxsize=None)
+def _start_regexp() -> Pattern:
+    """
+    匹配可能是 emoji 开头的字符。BMP 内的字符逐个列出，BMP 以外的合并成一个范围
+    （只用于筛选，多出的字符由 trie 正则排除），这样 re 可以快速扫描。
+    """
+    starts = sorted({ord(emoji[0]) for emoji in unicode_codes.LANG_EMOJI["en"].values()})
+    bmp = "".join(re.escape(chr(code)) for code in starts if code <= 0xFFFF)
+    astral = [code for code in starts if code > 0xFFFF]
+    if astral:
+        bmp += chr(astral[0]) + "-" + chr(astral[-1])
+    return re.compile("[" + bmp + "]")
+
+
+@functools.lru_cache(maxsize=None)
+def _demojize_table(delimiters: Delimiters, lang: str) -> Dict[str, str]:
+    if lang not in unicode_codes.EMOJI_LANG:
+        raise ValueError("invalid language: {}".format(lang))
+    codes = unicode_codes.EMOJI_LANG[lang]
+    return {
+        emoji: delimiters[0] + codes.get(emoji, emoji)[1:-1] + delimiters[1]
+        for emoji in unicode_codes.LANG_EMOJI["en"].values()
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _emojize_rule(delimiters: Delimiters, lang: str) -> Tuple[Pattern, Dict[str, str]]:
+    if lang not in unicode_codes.LANG_EMOJI:
+        raise ValueError("invalid language: {}".format(lang))
+    # 与 emojiswitch 相同，分隔符不转义
+    if lang == "zh":
+        pattern = re.compile(u"(%s[\u4e00-\u9fa5]+%s)" % delimiters)
+    else:
+        pattern = re.compile(u'(%s[a-zA-Z0-9\\+\\-_&.ô’Åéãíç()!#*]+%s)' % delimiters)
+    return pattern, unicode_codes.LANG_EMOJI[lang]
+
+
+def prepare(delimiters: Delimiters = (_DEFAULT_DELIMITER, _DEFAULT_DELIMITER), lang: str = "zh") -> None:
+    """预先构建指定分隔符和语言的正则与替换表，避免第一条消息时才构建。"""
+    _emoji_regexp()
+    _start_regexp()
+    _demojize_table(delimiters, lang)
+    _emojize_rule(delimiters, lang)
+
+
+def emojize(string: str, delimiters: Delimiters = (_DEFAULT_DELIMITER, _DEFAULT_DELIMITER), lang: str = "zh") -> str:
+    """把 :名称: 替换为 emoji，与 emojiswitch.emojize 相同。"""
+    pattern, table = _emojize_rule(delimiters, lang)
+    start, end = delimiters
+
+    def replace(match):
+        name = match.group(1).replace(start, _DEFAULT_DELIMITER).replace(end, _DEFAULT_DELIMITER)
+        return table.get(name, name)
+
+    return pattern.sub(replace, string)
+
+
+def demojize(string: str, delimiters: Delimiters = (_DEFAULT_DELIMITER, _DEFAULT_DELIMITER), lang: str = "zh") -> str:
+    """把 emoji 替换为 :名称:，与 emojiswitch.demojize 相同。"""
+    table = _demojize_table(delimiters, lang)
+    find_start = _start_regexp().search
+    match_emoji = _emoji_regexp().match
+    candidate = find_start(string)
+    if candidate is None:
+        return string.replace(u"\ufe0f", "")
+    parts = []
+    position = 0
+    while candidate is not None:
+        match = match_emoji(string, candidate.start())
+        if match is None:
+            candidate = find_start(string, candidate.start() + 1)
+            continue
+        parts.append(string[position:match.start()])
+        parts.append(table[match.group(0)])
+        position = match.end()
+        candidate = find_start(string, position)
+    parts.append(string[position:])
+    return "".join(parts).replace(u"\ufe0f", "")
+
+
+@functools.lru_cache(maxsize=1024)
+def demojize_name(name: str, delimiters: Delimiters = (_DEFAULT_DELIMITER, _DEFAULT_DELIMITER), lang: str = "zh") -> str:
+    """带缓存的 demojize，用于群昵称等反复出现的短字符串。"""
+    return demojize(name, delimiters, lang)
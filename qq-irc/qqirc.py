@@ -6,10 +6,16 @@ from nonebot.rule import is_type
 import asyncio
 import os
 import pydle
-import emojiswitch
-import _thread
+import sys
 import time 
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import EmojiEngine
+from irc_encoder import IRCEncoder
+import relay_hub
+from supervisor import Supervisor
+
 # 全局变量
 is_transmessage = True
 channel = '#dcms'
@@ -17,6 +23,11 @@ group_id = 310379632
 bot_id = 3862850347
 message_headers = ('[DCMS] ', '[WV] ', '[XMPP] ', '[TG]')
 start_time = time.time()  # 启动时间
+irc_task = None
+# IRC 客户端出错时只重启它自己，NoneBot 和 QQ 连接不受影响
+supervisor = Supervisor(initial_delay=5)
+# 由 relay-hub/run_hub.py 启动时为中继模式：不连接 IRC，消息直接经过进程内的中继中心转发
+hub = relay_hub.active()
 
 emoji_dict={4: '得意', 5: '流泪', 8: '睡', 9: '大哭', 10: '尴尬', 12: '调皮', 14: '微笑', 16: '酷', 21: '可爱', 23: '傲慢', 24: '饥饿', 25: '困', 26: '惊恐', 27: '流汗', 28: '憨笑', 29: '悠闲', 30: '奋斗', 32: '疑问', 33: '嘘', 34: '晕', 38: '敲打', 39: '再见', 41: '发抖', 42: '爱情', 43: '跳跳', 49: '拥抱', 53: '蛋糕', 60: '咖啡', 63: '玫瑰', 66: '爱心', 74: '太阳', 75: '月亮', 76: '赞', 78: '握手', 79: '胜利', 85: '飞吻', 89: '西瓜', 96: '冷汗', 97: '擦汗', 98: '抠鼻', 99: '鼓掌', 100: '糗大了', 101: '坏笑', 102: '左哼哼', 103: '右哼哼', 104: '哈欠', 106: '委屈', 109: '左亲亲', 111: '可怜', 116: '示爱', 118: '抱拳', 120: '拳头', 122: '爱你', 123: 'NO', 124: 'OK', 125: '转圈', 129: '挥手', 144: '喝彩', 147: '棒棒糖', 171: '茶', 173: '泪奔', 174: '无奈', 175: '卖萌', 176: '小纠结', 179: 'doge', 180: '惊喜', 181: '骚扰', 182: '笑哭', 183: '我最美', 201: '点赞', 203: '托脸', 212: '托腮', 214: '啵啵', 219: '蹭一蹭', 222: '抱抱', 227: '拍手', 232: '佛系', 240: '喷脸', 243: '甩头', 246: '加油抱抱', 262: '脑阔疼', 264: '捂脸', 265: '辣眼睛', 266: '哦哟', 267: '头秃', 268: '问号脸', 269: '暗中观察', 270: 'emm', 271: '吃瓜', 272: '呵呵哒', 273: '我酸了', 277: '汪汪', 278: '汗', 281: '无眼笑', 282: '敬礼', 284: '面无表情', 285: '摸鱼', 287: '哦', 289: '睁眼', 290: '敲开心', 293: '摸锦鲤', 294: '期待', 297: '拜谢', 298: '元宝', 299: '牛啊', 305: '右亲亲', 306: '牛气冲天', 307: '喵喵', 314: '仔细分析', 315: '加油', 318: '崇拜', 319: '比心', 320: '庆祝', 322: '拒绝', 324: '吃糖', 326: '生气'}
 
@@ -25,11 +36,35 @@ nonebot.init()
 driver = nonebot.get_driver()
 driver.register_adapter(Adapter)
 
+# 启动时构建 emoji 转换用的正则和替换表
+EmojiEngine.prepare(delimiters=(":", ":"), lang="en")
+EmojiEngine.prepare(delimiters=(":", ":"), lang="zh")
+
 # IRC 客户端类
 class MyOwnBot(pydle.Client):
+    lost = None  # 当前连接断开时触发的 asyncio.Event
+
+    async def serve(self, hostname):
+        """连接 IRC 并等待连接断开，断开或连接失败时抛出异常，由 supervisor 重启"""
+        self.lost = asyncio.Event()
+        await self.connect(hostname)
+        await self.lost.wait()
+        raise ConnectionError("IRC connection lost")
+
     async def on_connect(self):
         await self.join(channel)
 
+    async def message(self, target, message):
+        """按 512 字节限制在 UTF-8 字符边界拆分，转发消息的后续行保留 "[QQ] 昵称: " 前缀"""
+        encoder.nick = self.nickname
+        for line in encoder.split(target, message):
+            await self.rawmsg("PRIVMSG", target, line)
+
+    async def on_disconnect(self, expected):
+        # 不使用 pydle 自带的重连，由 supervisor 按退避间隔重启
+        if self.lost is not None:
+            self.lost.set()
+
     async def on_message(self, target, source, message):
         global is_transmessage
         if source != self.nickname:  # 避免自我消息循环
@@ -46,15 +81,15 @@ class MyOwnBot(pydle.Client):
             elif is_transmessage and not message.startswith(';'):
                 try:
                     qqbot = nonebot.get_bot()
-                    message = emojiswitch.emojize(message, delimiters=(":", ":"), lang="en")
+                    message = EmojiEngine.emojize(message, delimiters=(":", ":"), lang="en")
                     if message.startswith(message_headers):
                         await qqbot.send_group_msg(group_id=group_id, message=f'{message}')
                     else:
                         await qqbot.send_group_msg(group_id=group_id, message=f'[IRC] {source}: {message}')
                 except Exception as e:
                     print(f"Failed to send group message: {e}")
-        except:
-            self.restart_script()
+        except Exception as e:
+            print(f"Failed to handle IRC message: {e}")
 
     async def report_status(self, source):
         uptime = time.time() - start_time
@@ -69,7 +104,8 @@ class MyOwnBot(pydle.Client):
             f"QQ Bot ID: {bot_id}\n"
             f"Uptime: {uptime_str}\n"
             f"QQ Logged In: {qq_logged_in}\n"
-            f"IRC Logged In: {irc_logged_in}"
+            f"IRC Logged In: {irc_logged_in}\n"
+            f"Restarts: {supervisor.summary()}"
         )
         try:
             await self.message(channel, status_message)
@@ -88,14 +124,12 @@ class MyOwnBot(pydle.Client):
     async def send_message(self, target, message):
         try:
             await self.message(target, message)
-        except:
-            self.restart_script()
-
-    def restart_script(self):
-        os.system(r'start C:\Users\x8192Bit\Documents\qq-irc\run.bat')
-        exit()
+        except Exception as e:
+            # 连接已断开时 on_disconnect 会通知 supervisor 重连
+            print(f"Failed to send IRC message: {e}")
 
 client = MyOwnBot('qqirc_bridge', realname='qqirc_bridge')
+encoder = IRCEncoder('qqirc_bridge')
 
 # 加载插件
 nonebot.load_plugins("qq-irc/plugins")
@@ -132,7 +166,7 @@ async def set_transmessage_state(qqbot, state):
 
 async def forward_group_message_to_irc(event):
     nickname = event.sender.card or event.sender.nickname
-    nickname = emojiswitch.demojize(str(nickname), delimiters=(":", ":"), lang="zh")
+    nickname = EmojiEngine.demojize_name(str(nickname), (":", ":"), "zh")
 
     # 合并消息段
     combined_message = []
@@ -144,11 +178,14 @@ async def forward_group_message_to_irc(event):
     # 分号开头之消息，不转发
     if combined_message and not combined_message[0].startswith(';'):
         # 解决该死的一堆表情的问题
-        await client.send_message(channel, f'[QQ] {nickname}: {" ".join(combined_message)}')
+        if hub is not None:
+            hub.publish("qq", "QQ", nickname, " ".join(combined_message))
+        else:
+            await client.send_message(channel, f'[QQ] {nickname}: {" ".join(combined_message)}')
 
 async def process_message_segment(message_segment):
     handlers = {
-        'text': lambda: emojiswitch.demojize(message_segment.to_rich_text(), delimiters=(":", ":"), lang="zh"),
+        'text': lambda: EmojiEngine.demojize(message_segment.to_rich_text(), delimiters=(":", ":"), lang="zh"),
         'image': lambda: f'[图片] {message_segment.data["url"]}',
         'face': lambda: f'[表情] {emoji_dict[int(message_segment.data["id"])] if int(message_segment.data["id"]) in emoji_dict else message_segment.data["id"]}',
         'record': lambda: f'[语音] {message_segment.data["file"]}',
@@ -165,9 +202,28 @@ async def process_message_segment(message_segment):
     handler = handlers.get(message_segment.type)
     return handler() if handler else None
 
-# 启动 IRC 客户端
-def runIRCClient():
-    client.run('chat.freenode.net')
+async def relay_from_hub(message):
+    """中继模式：把其他平台的消息发送到QQ群，在 NoneBot 的事件循环中执行"""
+    if is_transmessage:
+        text = EmojiEngine.emojize(message.format(), delimiters=(":", ":"), lang="en")
+        await nonebot.get_bot().send_group_msg(group_id=group_id, message=text)
+
+# IRC 客户端作为 NoneBot 的启动任务运行在同一个事件循环中，转发时直接 await，不跨线程
+@driver.on_startup
+async def start_irc_client():
+    global irc_task
+    if hub is not None:
+        hub.register("qq", relay_from_hub, loop=asyncio.get_running_loop())
+        return
+    # 不等待连接完成，IRC 不可用时不影响 NoneBot 启动
+    irc_task = supervisor.spawn("irc", client.serve, 'chat.freenode.net')
+
+@driver.on_shutdown
+async def stop_irc_client():
+    if irc_task is None:
+        return
+    irc_task.cancel()
+    client.lost = None
+    await client.disconnect(expected=True)
 
-_thread.start_new_thread(runIRCClient, ())
 nonebot.run()
\ No newline at end of file
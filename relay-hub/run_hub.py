@@ -0,0 +1,82 @@
+"""
+在一个进程中运行多个桥接，各平台之间的消息经过进程内的 RelayHub 直接转发，
+不再经过 IRC 频道中转。IRC 连接只保留 DCMS 桥的一个，IRC 是中继中心的一个目的地。
+
+每个桥接加载时切换到自己的目录，读取各自的 config.xml 等配置；
+QQ 桥依赖 NoneBot 的事件循环，在主线程中最后启动，未启用 QQ 时主线程只等待。
+
+用法（在仓库根目录运行，QQ 桥的插件路径相对于根目录）：
+    python relay-hub/run_hub.py
+"""
+
+import importlib.util
+import logging
+import os
+import runpy
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "common"))
+from relay_hub import RelayHub, install
+from supervisor import Supervisor
+
+# 启用的桥接
+HUB_CONFIG = {
+    "dcms": True,  # irc-dcms/IRC.py：IRC 和 DCMS 两个目的地
+    "xmpp": True,  # xmpp-irc/xmpp-irc_bridge.py
+    "telegram": True,  # tele-irc/telegram-irc_bridge.py
+    "qq": True,  # qq-irc/qqirc.py
+}
+
+BRIDGES = {
+    "dcms": ("irc-dcms", "IRC.py", "IRC"),
+    "xmpp": ("xmpp-irc", "xmpp-irc_bridge.py", "xmpp_irc_bridge"),
+    "telegram": ("tele-irc", "telegram-irc_bridge.py", "telegram_irc_bridge"),
+}
+
+
+def start_bridge(name: str, hub: RelayHub, supervisor: Supervisor) -> None:
+    """在桥接所在目录加载模块并调用它的 attach_hub()"""
+    directory, filename, module_name = BRIDGES[name]
+    path = os.path.join(ROOT, directory)
+    sys.path.append(path)
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(path, filename))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        module.attach_hub(hub, supervisor)
+    finally:
+        os.chdir(cwd)
+    logging.info(f"Bridge {name} attached to relay hub")
+
+
+def main() -> None:
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    hub = RelayHub()
+    install(hub)
+    # 所有桥接的组件共用一个监督器，其中一个出错时只重启它自己
+    supervisor = Supervisor(initial_delay=5)
+    for name in BRIDGES:
+        if HUB_CONFIG[name]:
+            start_bridge(name, hub, supervisor)
+
+    try:
+        if HUB_CONFIG["qq"]:
+            # qqirc.py 在加载时启动 NoneBot，并在启动后把QQ群登记为目的地
+            runpy.run_path(os.path.join(ROOT, "qq-irc", "qqirc.py"), run_name="__main__")
+        else:
+            while True:
+                time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+        hub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+本地模拟的 Telegram Bot API，用于在不访问 api.telegram.org 的情况下测试桥接的轮询和 webhook 模式。
+
+支持桥接用到的接口：getMe、setWebhook、deleteWebhook、getWebhookInfo、
+getUpdates（长轮询）和 sendMessage，可以模拟 sendMessage 的 429 限流。
+push_message() 模拟群组中的一条新消息：设置了 webhook 时像 Telegram 一样
+带上 X-Telegram-Bot-Api-Secret-Token 推送到 webhook 地址，否则留给 getUpdates。
+
+单独运行时在本地启动一个服务器，并定时产生群组消息：
+    python FakeBotAPI.py --port 8081 --chat-id -1001 --rate 1
+然后在 config.xml 的 <telegram> 中设置 <api_url>http://127.0.0.1:8081/bot</api_url>。
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+import argparse
+import itertools
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class FakeBotAPIServer:
+    """内存中的 Bot API 模拟服务器。"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        token: str = "123456:TEST",
+        chat_id: int = -1001,
+        bot_username: str = "fake_bridge_bot",
+        rate_limit_every: int = 0,
+        retry_after: int = 1,
+    ) -> None:
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示自动分配
+            token: 接受的 Bot token，其他 token 返回 401
+            chat_id: push_message() 使用的群组ID
+            bot_username: getMe 返回的机器人用户名
+            rate_limit_every: 每隔多少次 sendMessage 返回一次 429，0 表示不限流
+            retry_after: 429 响应中的 retry_after（秒）
+        """
+        self.token = token
+        self.chat_id = chat_id
+        self.bot_username = bot_username
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self._updates_ready = threading.Condition(self._lock)
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._updates: List[Dict[str, Any]] = []  # 等待 getUpdates 取走的更新
+        self.webhook_url: Optional[str] = None
+        self.webhook_secret: Optional[str] = None
+        self.sent: List[Dict[str, Any]] = []  # 机器人通过 sendMessage 发出的消息
+        self.pushed: List[Tuple[int, float]] = []  # 推送到 webhook 的 (HTTP状态码, 耗时)
+        self.requests: Dict[str, int] = {}  # 各接口的请求次数
+
+        server = self
+        class Handler(_Handler):
+            fake = server
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._stop = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        """传给 ApplicationBuilder().base_url() 的地址"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self) -> "FakeBotAPIServer":
+        threading.Thread(target=self.httpd.serve_forever, name="FakeBotAPI", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            self._updates_ready.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def push_message(self, text: str, username: str = "alice", secret: Optional[str] = None) -> Optional[int]:
+        """
+        模拟群组中的一条新消息。
+
+        Args:
+            text: 消息内容
+            username: 发送者的用户名
+            secret: 可选，推送时使用的 secret，默认使用 setWebhook 时登记的值，用于测试错误的 secret
+
+        Returns:
+            推送到 webhook 时返回 HTTP 状态码；没有设置 webhook 时返回 None，更新留给 getUpdates
+        """
+        with self._lock:
+            update = {
+                "update_id": next(self._update_ids),
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": self.chat_id, "type": "supergroup", "title": "Fake Group"},
+                    "from": {"id": 1000 + len(username), "is_bot": False, "first_name": username, "username": username},
+                    "text": text,
+                },
+            }
+            url = self.webhook_url
+            if secret is None:
+                secret = self.webhook_secret
+            if url is None:
+                self._updates.append(update)
+                self._updates_ready.notify_all()
+                return None
+
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(update).encode("utf-8"),
+            headers={"Content-Type": "application/json", SECRET_HEADER: secret or ""},
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        with self._lock:
+            self.pushed.append((status, time.perf_counter() - started))
+        return status
+
+    def generate_messages(self, rate: float, text: str = "fake message") -> None:
+        """以每秒 rate 条的速率产生群组消息。"""
+        def run():
+            for number in itertools.count(1):
+                if self._stop.wait(1 / rate):
+                    return
+                try:
+                    self.push_message(f"{text} #{number}")
+                except OSError:
+                    pass  # webhook 尚未开始监听
+        threading.Thread(target=run, name="FakeBotAPI-Generator", daemon=True).start()
+
+    # 以下为请求处理
+
+    def handle(self, token: str, method: str, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """处理一次 Bot API 请求，返回 (HTTP状态码, 响应内容)。"""
+        with self._lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+        if token != self.token:
+            return 401, {"ok": False, "error_code": 401, "description": "Unauthorized"}
+
+        if method == "getMe":
+            return 200, _ok({
+                "id": 4242, "is_bot": True, "first_name": "Fake Bridge", "username": self.bot_username,
+                "can_join_groups": True, "can_read_all_group_messages": True, "supports_inline_queries": False,
+            })
+        if method == "setWebhook":
+            with self._lock:
+                self.webhook_url = params.get("url") or None
+                self.webhook_secret = params.get("secret_token")
+                if params.get("drop_pending_updates"):
+                    self._updates.clear()
+            return 200, _ok(True)
+        if method == "deleteWebhook":
+            with self._lock:
+                self.webhook_url = None
+                self.webhook_secret = None
+                if params.get("drop_pending_updates"):
+                    self._updates.clear()
+            return 200, _ok(True)
+        if method == "getWebhookInfo":
+            with self._lock:
+                return 200, _ok({
+                    "url": self.webhook_url or "", "has_custom_certificate": False,
+                    "pending_update_count": len(self._updates),
+                })
+        if method == "getUpdates":
+            return 200, _ok(self._get_updates(params))
+        if method == "sendMessage":
+            return self._send_message(params)
+        return 404, {"ok": False, "error_code": 404, "description": "Not Found: method not found"}
+
+    def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        deadline = time.monotonic() + float(params.get("timeout") or 0)
+        with self._lock:
+            if self.webhook_url is not None:
+                return []
+            while True:
+                # offset 之前的更新视为已确认
+                self._updates = [update for update in self._updates if update["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if self._updates or remaining <= 0 or self._stop.is_set():
+                    return list(self._updates[:int(params.get("limit") or 100)])
+                self._updates_ready.wait(remaining)
+
+    def _send_message(self, params: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        with self._lock:
+            count = self.requests["sendMessage"]
+            if self.rate_limit_every and count % self.rate_limit_every == 0:
+                return 429, {
+                    "ok": False, "error_code": 429,
+                    "description": f"Too Many Requests: retry after {self.retry_after}",
+                    "parameters": {"retry_after": self.retry_after},
+                }
+            message = {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "supergroup", "title": "Fake Group"},
+                "from": {"id": 4242, "is_bot": True, "first_name": "Fake Bridge", "username": self.bot_username},
+                "text": params.get("text", ""),
+            }
+            self.sent.append(message)
+        return 200, _ok(message)
+
+
+def _ok(result: Any) -> Dict[str, Any]:
+    return {"ok": True, "result": result}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake: FakeBotAPIServer = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _params(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        if not body:
+            return {}
+        if (self.headers.get("Content-Type") or "").startswith("application/json"):
+            return json.loads(body)
+        # python-telegram-bot 以表单提交，复杂类型的值是 JSON 字符串
+        params = {}
+        for key, values in parse_qs(body).items():
+            try:
+                params[key] = json.loads(values[-1])
+            except ValueError:
+                params[key] = values[-1]
+        return params
+
+    def _serve(self) -> None:
+        # 路径形如 /bot<token>/<method>
+        parts = self.path.split("?", 1)[0].strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            self.send_error(404)
+            return
+        status, payload = self.fake.handle(parts[0][3:], parts[1], self._params())
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self._serve()
+
+    def do_POST(self) -> None:
+        self._serve()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="本地模拟的 Telegram Bot API 服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--token", default="123456:TEST", help="接受的 Bot token")
+    parser.add_argument("--chat-id", type=int, default=-1001, help="模拟群组的ID")
+    parser.add_argument("--rate", type=float, default=0.0, help="每秒产生的群组消息数")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="每隔多少次 sendMessage 返回一次 429")
+    args = parser.parse_args()
+
+    server = FakeBotAPIServer(
+        args.host, args.port, args.token, args.chat_id, rate_limit_every=args.rate_limit_every
+    ).start()
+    if args.rate:
+        server.generate_messages(args.rate)
+    print(f"FakeBotAPI listening on {server.base_url}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
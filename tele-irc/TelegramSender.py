@@ -0,0 +1,167 @@
+"""
+Telegram 发送队列。
+
+发往 Telegram 群组的消息先进入队列，由 Telegram 事件循环中的任务按令牌桶限速发送
+（Telegram 对群组的限制约为每分钟 20 条）。等待发送期间到达的多行消息合并成一条
+多行消息，单条不超过 4096 字符。收到 429 时按 retry_after 等待后重发，
+网络错误时有限次重试。群组升级为超级群组（ChatMigrated）时改用新的群组ID重发，
+其他错误记录后丢弃该条消息，发送任务不会因此退出。
+"""
+
+from collections import deque
+from typing import Deque, List, Optional
+import asyncio
+import datetime
+import logging
+import threading
+import time
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, NetworkError, RetryAfter, TelegramError, TimedOut
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TelegramSender:
+    """限速、合并消息的 Telegram 发送队列，submit() 可在任意线程调用。"""
+
+    def __init__(
+        self,
+        bot,
+        chat_id: int,
+        rate: float = 20 / 60,
+        burst: int = 3,
+        max_length: int = MAX_MESSAGE_LENGTH,
+        max_queue: int = 1000,
+        max_retries: int = 3,
+    ) -> None:
+        """
+        Args:
+            bot: telegram.Bot
+            chat_id: 目标群组ID
+            rate: 每秒补充的令牌数，即持续发送速率
+            burst: 令牌桶容量，即允许的突发条数
+            max_length: 合并后单条消息的最大长度
+            max_queue: 队列中最多等待的行数，超出时丢弃最旧的
+            max_retries: 网络错误时的最大重试次数
+        """
+        self.bot = bot
+        self.chat_id = chat_id
+        self.rate = rate
+        self.burst = burst
+        self.max_length = max_length
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self._lines: Deque[str] = deque()
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.stats = {"lines": 0, "sent": 0, "merged": 0, "dropped": 0, "rate_limited": 0, "failed": 0}
+
+    def submit(self, text: str) -> None:
+        """加入一行待发送的消息，立即返回。"""
+        with self._lock:
+            if len(self._lines) >= self.max_queue:
+                dropped = self._lines.popleft()
+                self.stats["dropped"] += 1
+                logging.warning(f"Telegram 发送队列已满，丢弃：{dropped}")
+            self._lines.append(text)
+            self.stats["lines"] += 1
+            loop, wakeup = self._loop, self._wakeup
+        if loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            wakeup.set()  # 在发送任务所在的事件循环中调用时无需跨线程唤醒
+        else:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    def depth(self) -> int:
+        """队列中等待发送的行数。"""
+        with self._lock:
+            return len(self._lines)
+
+    def _take_batch(self) -> List[str]:
+        """取出不超过 max_length 的若干行，超长的单行拆分发送。"""
+        with self._lock:
+            if not self._lines:
+                return []
+            first = self._lines.popleft()
+            if len(first) > self.max_length:
+                self._lines.appendleft(first[self.max_length:])
+                return [first[:self.max_length]]
+            batch, length = [first], len(first)
+            while self._lines and length + 1 + len(self._lines[0]) <= self.max_length:
+                line = self._lines.popleft()
+                batch.append(line)
+                length += 1 + len(line)
+            return batch
+
+    async def _acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def run(self) -> None:
+        """在 Telegram 事件循环中持续发送。"""
+        self._wakeup = asyncio.Event()
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+        while True:
+            if not self.depth():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # 等待令牌期间到达的行会合并到同一条消息中
+            await self._acquire()
+            batch = self._take_batch()
+            if not batch:
+                continue
+            await self._send("\n".join(batch))
+            self.stats["merged"] += len(batch) - 1
+
+    async def _send(self, text: str) -> None:
+        attempt = 0
+        while True:
+            try:
+                await self.bot.send_message(self.chat_id, text)
+                self.stats["sent"] += 1
+                return
+            except RetryAfter as e:
+                delay = e.retry_after
+                if isinstance(delay, datetime.timedelta):
+                    delay = delay.total_seconds()
+                self.stats["rate_limited"] += 1
+                logging.warning(f"Telegram 限流，{delay} 秒后重发")
+                await asyncio.sleep(delay)
+            except ChatMigrated as e:
+                logging.warning(f"Telegram 群组已迁移到 {e.new_chat_id}，改用新的群组ID")
+                self.chat_id = e.new_chat_id
+            except (BadRequest, Forbidden) as e:
+                self.stats["failed"] += 1
+                logging.error(f"Telegram 拒绝发送，已丢弃：{e}")
+                return
+            except (TimedOut, NetworkError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.stats["failed"] += 1
+                    logging.error(f"Telegram 发送失败，已丢弃：{e}")
+                    return
+                logging.warning(f"Telegram 发送出错，第 {attempt} 次重试：{e}")
+                await asyncio.sleep(2 ** attempt)
+            except TelegramError as e:
+                self.stats["failed"] += 1
+                logging.error(f"Telegram 发送出错，已丢弃：{e}")
+                return
+            except Exception as e:
+                self.stats["failed"] += 1
+                logging.exception(f"Telegram 发送时出现未预期的错误，已丢弃：{e}")
+                return
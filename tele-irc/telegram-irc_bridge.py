@@ -1,8 +1,12 @@
 import logging
+import os
+import secrets
+import sys
 import threading
-import time
 import datetime
 import irc.client
+import irc.client_aio
+import irc.connection
 import asyncio
 import xml.etree.ElementTree as ET  # 用于解析 XML 配置文件
 from telegram import Update
@@ -13,22 +17,54 @@ from telegram.ext import (
     ContextTypes,
 )
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from irc_encoder import IRCEncoder
+from irc_scheduler import IRCSendScheduler
+from relay_hub import RelayHub
+from supervisor import Supervisor
+import tls
+from TelegramSender import TelegramSender
+
 # 从 XML 配置文件加载配置
 def load_config(file_path):
     tree = ET.parse(file_path)
     root = tree.getroot()
     irc_config = root.find("irc")
     telegram_config = root.find("telegram")
+    # 可选，<mode>webhook</mode> 时由 Telegram 推送更新，否则长轮询
+    mode = (telegram_config.findtext("mode") or "polling").strip().lower()
+    webhook = None
+    webhook_config = telegram_config.find("webhook")
+    if mode == "webhook":
+        if webhook_config is None or not webhook_config.findtext("url"):
+            raise ValueError("webhook 模式需要在 <telegram><webhook> 中配置 <url>")
+        webhook = {
+            # Telegram 访问的公网地址（HTTPS，通常由反向代理转发到本地监听端口）
+            "url": webhook_config.findtext("url").strip(),
+            "listen": (webhook_config.findtext("listen") or "127.0.0.1").strip(),
+            "port": int(webhook_config.findtext("port") or 8443),
+            "path": (webhook_config.findtext("path") or "telegram").strip().strip("/"),
+            # 未配置时每次启动随机生成，Telegram 推送时会在请求头中带上
+            "secret": (webhook_config.findtext("secret") or "").strip() or secrets.token_urlsafe(32),
+        }
+    elif mode != "polling":
+        raise ValueError(f"未知的 Telegram 模式：{mode}")
     return {
         "irc": {
             "server": irc_config.find("server").text,
             "port": int(irc_config.find("port").text),
             "nickname": irc_config.find("nickname").text,
             "channel": irc_config.find("channel").text,
+            # 可选，<ssl>true</ssl> 时使用 TLS 连接
+            "ssl": (irc_config.findtext("ssl") or "").strip().lower() in ("1", "true", "yes"),
         },
         "telegram": {
             "token": telegram_config.find("token").text,
             "chat_id": int(telegram_config.find("chat_id").text),
+            "mode": mode,
+            "webhook": webhook,
+            # 可选，Bot API 地址，用于自建 Bot API 服务器或本地测试（FakeBotAPI.py）
+            "api_url": (telegram_config.findtext("api_url") or "").strip() or None,
         },
     }
 
@@ -54,17 +90,32 @@ IRC_SERVER = config["irc"]["server"]
 IRC_PORT = config["irc"]["port"]
 IRC_NICK = config["irc"]["nickname"]
 IRC_CHANNEL = config["irc"]["channel"]
+IRC_SSL = config["irc"]["ssl"]
 
 TELEGRAM_TOKEN = config["telegram"]["token"]
 TELEGRAM_CHAT_ID = config["telegram"]["chat_id"]
+TELEGRAM_MODE = config["telegram"]["mode"]
+TELEGRAM_WEBHOOK = config["telegram"]["webhook"]
+TELEGRAM_API_URL = config["telegram"]["api_url"]
 
 class TelegramBot:
-    def __init__(self, token: str, chat_id: int):
+    def __init__(self, token: str, chat_id: int, mode: str = "polling", webhook: dict = None, api_url: str = None):
         self.chat_id = chat_id
-        self.app = ApplicationBuilder().token(token).http_version("1.1").connection_pool_size(100).build()
+        self.mode = mode
+        self.webhook = webhook
+        builder = (
+            ApplicationBuilder().token(token).http_version("1.1").connection_pool_size(100)
+        )
+        if api_url:
+            builder = builder.base_url(api_url)
+        self.app = builder.build()
+        # 发往 Telegram 的转发消息经过限速、合并的发送队列
+        self.sender = TelegramSender(self.app.bot, chat_id)
         self.bot_username = None
         self.irc_send_callback = None
-        self.loop = None  # 用于存储轮询线程的事件循环
+        self.irc_queue_depth = None  # 返回 IRC 发送队列长度的回调
+        self.supervisor = None  # 可选，用于在状态中报告各组件的重启次数
+        self.hub = None  # 中继模式下的 RelayHub，消息直接发布到其他平台，不经过 IRC
 
         # 注册消息处理器（调试阶段不加 filters.Chat）
         self.app.add_handler(
@@ -99,9 +150,15 @@ class TelegramBot:
             elif cmd == "status":
                 status = "开启" if relay_enabled.is_set() else "关闭"
                 uptime = datetime.datetime.now() - start_time
+                queued = self.irc_queue_depth() if self.irc_queue_depth else 0
+                stats = self.sender.stats
                 await context.bot.send_message(
                     self.chat_id,
-                    f"；状态：{status} | 已运行：{str(uptime).split('.')[0]}"
+                    f"；状态：{status} | 已运行：{str(uptime).split('.')[0]} | IRC 待发送：{queued} | "
+                    f"TG 待发送：{self.sender.depth()} | 合并：{stats['merged']} | 丢弃：{stats['dropped']} | "
+                    f"限流：{stats['rate_limited']}"
+                    + (f" | 重启：{self.supervisor.summary()}" if self.supervisor else "")
+                    + (f" | 中继：{self.hub.summary()}" if self.hub else "")
                 )
             return
 
@@ -109,32 +166,127 @@ class TelegramBot:
         if text.startswith(('!',';')):
             return
 
-        # 转发到 IRC
-        if relay_enabled.is_set() and self.irc_send_callback:
+        if not relay_enabled.is_set():
+            return
+        if self.hub is not None:
+            # 中继模式：直接发布到其他平台
+            self.hub.publish("telegram", "TG", user, text)
+        elif self.irc_send_callback:
+            # 转发到 IRC
             msg = f"[TG] {user}: {text}"
             logging.debug(f"调度转发到 IRC: {msg}")
             self.irc_send_callback(msg)
 
-    def run(self):
-        """在独立线程中创建并绑定事件循环，然后同步启动轮询"""
-        logging.debug("TelegramBot.run()：创建新事件循环并绑定到当前线程")
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        self.loop = loop
-        logging.debug("TelegramBot.run()：开始 run_polling()")
-        self.app.run_polling()
+    async def serve(self):
+        """
+        启动 Application 并一直运行，直到任务被取消。启动失败时抛出异常，
+        由 Supervisor 按退避间隔重新调用，发送队列中的消息保持不变。
+        """
+        app = self.app
+        sender_task = None
+        try:
+            await app.initialize()
+            # 发送任务意外退出时由 supervisor 记录并重启，队列中的消息保持不变
+            if self.supervisor:
+                sender_task = self.supervisor.spawn("telegram-sender", self.sender.run)
+            else:
+                sender_task = asyncio.get_running_loop().create_task(self.sender.run())
+                sender_task.add_done_callback(log_task_failure)
+            if self.mode == "webhook":
+                # 启动时向 Telegram 注册 webhook 地址和 secret，
+                # 推送请求头中的 X-Telegram-Bot-Api-Secret-Token 不匹配时返回 403
+                logging.debug(
+                    f"TelegramBot.serve()：开始 webhook，监听 {self.webhook['listen']}:{self.webhook['port']}"
+                    f"/{self.webhook['path']}"
+                )
+                await app.updater.start_webhook(
+                    listen=self.webhook["listen"],
+                    port=self.webhook["port"],
+                    url_path=self.webhook["path"],
+                    webhook_url=self.webhook["url"],
+                    secret_token=self.webhook["secret"],
+                )
+            else:
+                logging.debug("TelegramBot.serve()：开始轮询")
+                await app.updater.start_polling()
+            await app.start()
+            await asyncio.Event().wait()
+        finally:
+            if app.updater.running:
+                await app.updater.stop()
+            if app.running:
+                await app.stop()
+            await app.shutdown()
+            if sender_task is not None:
+                sender_task.cancel()
+
+def log_task_failure(task: asyncio.Task):
+    """后台任务异常退出时记录错误，否则异常要到任务被回收时才会出现"""
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"后台任务 {task.get_name()} 异常退出", exc_info=task.exception())
 
 class IRCBot:
-    def __init__(self, server, port, nickname, channel, telegram_bot: TelegramBot):
+    """运行在 Telegram 事件循环中的 IRC 客户端，收发消息都不经过其他线程"""
+
+    def __init__(self, server, port, nickname, channel, telegram_bot: TelegramBot, use_ssl: bool = False):
         self.relay_bot = telegram_bot
-        self.reactor = irc.client.Reactor()
-        self.conn = self.reactor.server().connect(server, port, nickname)
-        self.conn.add_global_handler("welcome", self.on_connect)
-        self.conn.add_global_handler("pubmsg", self.on_pubmsg)
+        self.server = server
+        self.port = port
+        self.nickname = nickname
+        # TLS 连接使用共用的 SSLContext
+        if use_ssl:
+            self.connect_factory = irc.connection.AioFactory(ssl=tls.get_context(), server_hostname=server)
+        else:
+            self.connect_factory = irc.connection.AioFactory()
+        self.reactor = None
+        self.conn = None
+        self._lost = None  # 当前连接断开时触发的 asyncio.Event
+        # 发往 IRC 的消息经过限速队列，由事件循环中的任务按令牌桶取出发送；
+        # 过长的消息按 512 字节限制拆分，积压时合并短消息
+        self.scheduler = IRCSendScheduler(is_ready=self.is_connected, encoder=IRCEncoder(nickname))
+
+    def is_connected(self):
+        return self.conn is not None and self.conn.is_connected()
+
+    def _setup(self):
+        """第一次连接前在事件循环中创建 reactor 和发送任务，重连时沿用"""
+        loop = asyncio.get_running_loop()
+        self.reactor = irc.client_aio.AioReactor(loop=loop)
+        self.conn = self.reactor.server()
+        self.reactor.add_global_handler("welcome", self.on_connect)
+        self.reactor.add_global_handler("pubmsg", self.on_pubmsg)
+        self.reactor.add_global_handler("disconnect", self.on_disconnect)
+        self.scheduler.bind(self.conn.privmsg, is_ready=self.is_connected)
+        self.sender_task = loop.create_task(self.scheduler.run_async())
+
+    async def serve(self):
+        """
+        连接 IRC 服务器并等待连接断开。连接失败或断开时抛出异常，
+        由 Supervisor 按退避间隔重新调用；任务被取消时断开连接。
+        """
+        if self.reactor is None:
+            self._setup()
+        self._lost = asyncio.Event()
+        try:
+            logging.debug(f"IRCBot: 连接 {self.server}:{self.port}")
+            await self.conn.connect(self.server, self.port, self.nickname, connect_factory=self.connect_factory)
+            await self._lost.wait()
+            raise ConnectionError("与 IRC 服务器断开")
+        except asyncio.CancelledError:
+            if self.conn.is_connected():
+                self.conn.disconnect("Bye")
+            self.sender_task.cancel()
+            raise
 
     def on_connect(self, connection, event):
         logging.debug(f"IRCBot: 已连接 IRC 服务器，加入频道 {IRC_CHANNEL}")
         connection.join(IRC_CHANNEL)
+        self.scheduler.wake()
+
+    def on_disconnect(self, connection, event):
+        logging.warning("IRCBot: 与 IRC 服务器断开")
+        if self._lost is not None:
+            self._lost.set()
 
     def on_pubmsg(self, connection, event):
         text = event.arguments[0]
@@ -155,44 +307,59 @@ class IRCBot:
             if "[DCMS]" in text:
                 msg = text[text.index("[DCMS]"):]
             logging.debug(f"调度转发到 Telegram: {msg}")
-            asyncio.run_coroutine_threadsafe(
-                self.relay_bot.app.bot.send_message(self.relay_bot.chat_id, msg),
-                self.relay_bot.loop
-            )
+            self.relay_bot.sender.submit(msg)
 
     def send_to_irc(self, message: str):
-        def _send():
-            self.conn.privmsg(IRC_CHANNEL, message)
         logging.debug(f"调度发送到 IRC 频道: {message}")
-        self.reactor.scheduler.execute_after(0, _send)
+        self.scheduler.submit(IRC_CHANNEL, message)
+        # 与 Telegram 处于同一个事件循环，有令牌时直接发送
+        self.scheduler.pump()
+
+
+async def run_bridge(tg_bot: TelegramBot, irc_bot: IRCBot):
+    """Telegram 和 IRC 作为两个组件在同一个事件循环中分别监督，其中一个出错时只重启它自己"""
+    supervisor = Supervisor(initial_delay=5)
+    tg_bot.supervisor = supervisor
+    irc_task = supervisor.spawn("irc", irc_bot.serve)
+    try:
+        await supervisor.run_async("telegram", tg_bot.serve)
+    finally:
+        irc_task.cancel()
 
-    def start(self):
-        logging.debug("IRCBot: 启动 Reactor 事件循环")
-        self.reactor.process_forever()
+
+def attach_hub(hub: RelayHub, supervisor: Supervisor) -> TelegramBot:
+    """
+    中继模式：不连接 IRC，Telegram 群组作为中继中心的一个目的地。
+    Telegram 在单独线程的事件循环中由 supervisor 监督，立即返回。
+    """
+    tg_bot = TelegramBot(
+        TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, mode=TELEGRAM_MODE, webhook=TELEGRAM_WEBHOOK, api_url=TELEGRAM_API_URL
+    )
+    tg_bot.hub = hub
+    tg_bot.supervisor = supervisor
+
+    def deliver(message):
+        # TelegramSender.submit() 可在任意线程调用
+        if relay_enabled.is_set():
+            tg_bot.sender.submit(message.format())
+
+    hub.register("telegram", deliver)
+    threading.Thread(
+        target=asyncio.run, args=(supervisor.run_async("telegram", tg_bot.serve),), name="Telegram", daemon=True
+    ).start()
+    return tg_bot
 
 
 def main():
     logging.debug("主程序启动")
-    # 1) 启动 Telegram 轮询线程
-    tg_bot = TelegramBot(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID)
-    t = threading.Thread(target=tg_bot.run, daemon=True, name="TG-Thread")
-    t.start()
-    time.sleep(1)
-    logging.debug(f"TG-Thread alive? {t.is_alive()}")
-
-    # 2) 启动 IRC Bot
-    irc_bot = IRCBot(IRC_SERVER, IRC_PORT, IRC_NICK, IRC_CHANNEL, tg_bot)
+    tg_bot = TelegramBot(
+        TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, mode=TELEGRAM_MODE, webhook=TELEGRAM_WEBHOOK, api_url=TELEGRAM_API_URL
+    )
+    irc_bot = IRCBot(IRC_SERVER, IRC_PORT, IRC_NICK, IRC_CHANNEL, tg_bot, use_ssl=IRC_SSL)
     tg_bot.irc_send_callback = irc_bot.send_to_irc
-    # 可以用线程，也可以直接阻塞调用 start()
-    i = threading.Thread(target=irc_bot.start, daemon=True, name="IRC-Thread")
-    i.start()
-    time.sleep(1)
-    logging.debug(f"IRC-Thread alive? {i.is_alive()}")
-
-    # 主线程保持活跃，防止脚本提前退出
+    tg_bot.irc_queue_depth = irc_bot.scheduler.depth
     try:
-        while True:
-            time.sleep(10)
+        asyncio.run(run_bridge(tg_bot, irc_bot))
     except KeyboardInterrupt:
         logging.debug("主程序收到中断，正在退出...")
 
@@ -0,0 +1,450 @@
+"""
+本地模拟的 XMPP 服务器，用于在不连接真实服务器的情况下测试 XMPP 桥接。
+
+只实现桥接用到的部分：SASL PLAIN 认证、资源绑定、会话、MUC 加入/离开/群聊消息
+（带 XEP-0359 stanza-id）、MUC 历史请求记录，以及 XEP-0198 流管理（enable、r/a、resume）。
+不支持 TLS，客户端需连接明文端口。
+
+可以模拟网络中断（drop）和中断前数据在途丢失（blackhole），用于测试会话恢复后
+是否只重发服务器未收到的消息。
+
+单独运行时在本地启动一个服务器：
+    python FakeXMPP.py --port 5222
+然后在 config.xml 中把 XMPP_SERVER 设为 127.0.0.1、XMPP_PORT 设为 5222 即可。
+"""
+
+from collections import deque
+from xml.etree.ElementTree import XMLPullParser
+from xml.sax.saxutils import escape, quoteattr
+import argparse
+import base64
+import itertools
+import secrets
+import socket
+import socketserver
+import threading
+import time
+
+NS_CLIENT = 'jabber:client'
+NS_SASL = 'urn:ietf:params:xml:ns:xmpp-sasl'
+NS_BIND = 'urn:ietf:params:xml:ns:xmpp-bind'
+NS_SESSION = 'urn:ietf:params:xml:ns:xmpp-session'
+NS_MUC = 'http://jabber.org/protocol/muc'
+NS_MUC_USER = 'http://jabber.org/protocol/muc#user'
+NS_SM = 'urn:xmpp:sm:3'
+NS_STANZA_ID = 'urn:xmpp:sid:0'
+NS_ROSTER = 'jabber:iq:roster'
+
+
+def _tag(ns, name):
+    return f'{{{ns}}}{name}'
+
+
+def _bare(jid):
+    return jid.split('/', 1)[0]
+
+
+class _Session:
+    """绑定资源后的一个 XMPP 会话，开启流管理后可以在断线后恢复"""
+
+    def __init__(self, server, jid):
+        self.server = server
+        self.jid = jid
+        self.sock = None
+        self.lock = threading.Lock()
+        self.sm_id = None  # 开启流管理后的会话ID
+        self.handled = 0  # 已处理的入站 stanza 数
+        self.sent = 0  # 已发送的出站 stanza 数
+        self.unacked = deque()  # (序号, stanza 文本)
+        self.detached_at = None
+        self.rooms = {}  # 房间 -> 昵称
+
+    def deliver(self, data):
+        with self.lock:
+            if self.sm_id is not None:
+                self.sent += 1
+                self.unacked.append((self.sent, data))
+            if self.sock is not None:
+                try:
+                    self.sock.sendall(data.encode('utf-8'))
+                except OSError:
+                    self.sock = None
+
+    def ack(self, h):
+        with self.lock:
+            while self.unacked and self.unacked[0][0] <= h:
+                self.unacked.popleft()
+
+    def resume(self, sock, h):
+        """把会话接到新连接上，并重发客户端未确认的 stanza"""
+        with self.lock:
+            while self.unacked and self.unacked[0][0] <= h:
+                self.unacked.popleft()
+            pending = [data for _, data in self.unacked]
+            self.unacked.clear()
+            self.sent = h
+            self.sock = sock
+            self.detached_at = None
+        return pending
+
+
+class FakeXMPPServer:
+    """内存中的 XMPP 模拟服务器"""
+
+    def __init__(self, host='127.0.0.1', port=0, domain='localhost', users=None,
+                 stream_management=True, resume_timeout=60):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0 表示自动分配
+            domain: 服务器域名
+            users: 可选，用户名 -> 密码；未提供时接受任意用户
+            stream_management: 是否提供 XEP-0198 流管理
+            resume_timeout: 断线后会话可恢复的时间（秒）
+        """
+        self.domain = domain
+        self.users = users
+        self.stream_management = stream_management
+        self.resume_timeout = resume_timeout
+        self.blackhole = False  # 为 True 时丢弃收到的所有数据，模拟在途丢失
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._sessions = {}  # sm_id -> _Session
+        self._connections = set()
+        self.rooms = {}  # 房间 -> {昵称: _Session，模拟用户为 None}
+        self.room_messages = []  # (房间, 昵称, 内容)
+        self.history_requests = []  # 加入房间时的 <history/> 属性
+        self.stats = {'connections': 0, 'auths': 0, 'binds': 0, 'enabled': 0, 'resumed': 0, 'failed': 0}
+
+        server = self
+        class Handler(_Handler):
+            fake = server
+        self.tcp = socketserver.ThreadingTCPServer((host, port), Handler, bind_and_activate=False)
+        self.tcp.daemon_threads = True
+        self.tcp.allow_reuse_address = True
+        self.tcp.server_bind()
+        self.tcp.server_activate()
+
+    @property
+    def address(self):
+        return self.tcp.server_address[:2]
+
+    def start(self):
+        threading.Thread(target=self.tcp.serve_forever, name='FakeXMPP', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.drop()
+        self.tcp.shutdown()
+        self.tcp.server_close()
+
+    def drop(self):
+        """断开所有连接，开启了流管理的会话保留到超时前可以恢复"""
+        with self._lock:
+            connections = list(self._connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def say(self, room, nick, body):
+        """以模拟用户的身份在房间中发言"""
+        with self._lock:
+            occupants = self.rooms.setdefault(room, {})
+            joined = nick not in occupants
+            occupants.setdefault(nick, None)
+        if joined:
+            self._broadcast_presence(room, nick)
+        self._broadcast_message(room, nick, body)
+
+    def occupants(self, room):
+        with self._lock:
+            return sorted(self.rooms.get(room, {}))
+
+    # 以下为协议处理
+
+    def _new_id(self):
+        return str(next(self._ids))
+
+    def _broadcast_presence(self, room, nick, typ=None, exclude=None):
+        with self._lock:
+            targets = [s for s in self.rooms.get(room, {}).values() if s is not None and s is not exclude]
+        for target in targets:
+            target.deliver(self._presence(room, nick, target.jid, typ))
+
+    def _presence(self, room, nick, to, typ=None, self_presence=False):
+        typ_attr = f" type='{typ}'" if typ else ''
+        status = "<status code='110'/>" if self_presence else ''
+        role = 'none' if typ == 'unavailable' else 'participant'
+        return (
+            f"<presence from={quoteattr(f'{room}/{nick}')} to={quoteattr(to)}{typ_attr}>"
+            f"<x xmlns='{NS_MUC_USER}'><item affiliation='none' role='{role}'/>{status}</x></presence>"
+        )
+
+    def _broadcast_message(self, room, nick, body):
+        with self._lock:
+            stanza_id = self._new_id()
+            self.room_messages.append((room, nick, body))
+            targets = [s for s in self.rooms.get(room, {}).values() if s is not None]
+        for target in targets:
+            target.deliver(
+                f"<message from={quoteattr(f'{room}/{nick}')} to={quoteattr(target.jid)} type='groupchat' "
+                f"id='m{stanza_id}'><body>{escape(body)}</body>"
+                f"<stanza-id xmlns='{NS_STANZA_ID}' id='{stanza_id}' by={quoteattr(room)}/></message>"
+            )
+
+    def _join(self, session, room, nick, muc):
+        history = muc.find(_tag(NS_MUC, 'history')) if muc is not None else None
+        with self._lock:
+            self.history_requests.append(dict(history.attrib) if history is not None else None)
+            occupants = self.rooms.setdefault(room, {})
+            existing = [(other, occupant) for other, occupant in occupants.items() if other != nick]
+            occupants[nick] = session
+            session.rooms[room] = nick
+        for other, _ in existing:
+            session.deliver(self._presence(room, other, session.jid))
+        session.deliver(self._presence(room, nick, session.jid, self_presence=True))
+        self._broadcast_presence(room, nick, exclude=session)
+
+    def _leave(self, session, room):
+        with self._lock:
+            nick = session.rooms.pop(room, None)
+            occupants = self.rooms.get(room, {})
+            if nick is None or occupants.get(nick) is not session:
+                return
+            del occupants[nick]
+        session.deliver(self._presence(room, nick, session.jid, 'unavailable', self_presence=True))
+        self._broadcast_presence(room, nick, 'unavailable')
+
+    def _end_session(self, session):
+        for room in list(session.rooms):
+            self._leave(session, room)
+        with self._lock:
+            if session.sm_id is not None:
+                self._sessions.pop(session.sm_id, None)
+
+    def _expire_sessions(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [s for s in self._sessions.values()
+                       if s.detached_at is not None and now - s.detached_at > self.resume_timeout]
+        for session in expired:
+            self._end_session(session)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    fake = None
+
+    def setup(self):
+        self.session = None
+        self.user = None
+        self.authenticated = False
+        self._new_parser()
+        with self.fake._lock:
+            self.fake._connections.add(self.request)
+            self.fake.stats['connections'] += 1
+        self.fake._expire_sessions()
+
+    def finish(self):
+        with self.fake._lock:
+            self.fake._connections.discard(self.request)
+        session = self.session
+        if session is None:
+            return
+        with session.lock:
+            if session.sock is not self.request:
+                return  # 会话已经在新连接上恢复
+            session.sock = None
+            session.detached_at = time.monotonic()
+        if session.sm_id is None or not self.fake.stream_management:
+            self.fake._end_session(session)
+
+    def _new_parser(self):
+        self.parser = XMLPullParser(events=('start', 'end'))
+        self.depth = 0
+        self.stream = None
+
+    def send(self, data):
+        if self.session is not None:
+            # 其他连接的线程也会通过 session.deliver 写入同一个 socket
+            with self.session.lock:
+                self.request.sendall(data.encode('utf-8'))
+        else:
+            self.request.sendall(data.encode('utf-8'))
+
+    def handle(self):
+        while True:
+            try:
+                data = self.request.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            if self.fake.blackhole:
+                continue
+            self.parser.feed(data)
+            for event, elem in self.parser.read_events():
+                if event == 'start':
+                    self.depth += 1
+                    if self.depth == 1:
+                        self.stream = elem
+                        self._open_stream()
+                elif event == 'end':
+                    self.depth -= 1
+                    if self.depth == 0:
+                        self.send('</stream:stream>')
+                        return
+                    if self.depth == 1:
+                        self.stream.remove(elem)
+                        if not self._element(elem):
+                            break  # 流已重新开始，后续数据交给新的解析器
+
+    def _open_stream(self):
+        self.send(
+            f"<?xml version='1.0'?><stream:stream xmlns='{NS_CLIENT}' "
+            f"xmlns:stream='http://etherx.jabber.org/streams' from='{self.fake.domain}' "
+            f"id='{secrets.token_hex(8)}' version='1.0'>"
+        )
+        if not self.authenticated:
+            features = f"<mechanisms xmlns='{NS_SASL}'><mechanism>PLAIN</mechanism></mechanisms>"
+        else:
+            features = f"<bind xmlns='{NS_BIND}'/><session xmlns='{NS_SESSION}'/>"
+            if self.fake.stream_management:
+                features += f"<sm xmlns='{NS_SM}'/>"
+        self.send(f"<stream:features>{features}</stream:features>")
+
+    def _element(self, elem):
+        """处理一个顶层元素，返回 False 表示流已重新开始"""
+        if elem.tag == _tag(NS_SASL, 'auth'):
+            return self._auth(elem)
+        if elem.tag.startswith(f'{{{NS_SM}}}'):
+            self._stream_management(elem)
+            return True
+        if self.session is not None and self.session.sm_id is not None:
+            with self.session.lock:
+                self.session.handled += 1
+        if elem.tag == _tag(NS_CLIENT, 'iq'):
+            self._iq(elem)
+        elif elem.tag == _tag(NS_CLIENT, 'presence'):
+            self._presence(elem)
+        elif elem.tag == _tag(NS_CLIENT, 'message'):
+            self._message(elem)
+        return True
+
+    def _auth(self, elem):
+        try:
+            _, user, password = base64.b64decode(elem.text or '').decode('utf-8').split('\0')
+        except ValueError:
+            user, password = None, None
+        users = self.fake.users
+        if not user or (users is not None and users.get(user) != password):
+            self.send(f"<failure xmlns='{NS_SASL}'><not-authorized/></failure>")
+            return True
+        self.user = user
+        self.authenticated = True
+        with self.fake._lock:
+            self.fake.stats['auths'] += 1
+        self.send(f"<success xmlns='{NS_SASL}'/>")
+        self._new_parser()
+        return False
+
+    def _iq(self, elem):
+        iq_id = quoteattr(elem.get('id', ''))
+        bind = elem.find(_tag(NS_BIND, 'bind'))
+        if bind is not None and self.authenticated:
+            resource = bind.findtext(_tag(NS_BIND, 'resource')) or secrets.token_hex(4)
+            self.session = _Session(self.fake, f'{self.user}@{self.fake.domain}/{resource}')
+            self.session.sock = self.request
+            with self.fake._lock:
+                self.fake.stats['binds'] += 1
+            self.send(f"<iq type='result' id={iq_id}><bind xmlns='{NS_BIND}'><jid>{escape(self.session.jid)}</jid></bind></iq>")
+            return
+        if self.session is None:
+            self.send(f"<iq type='error' id={iq_id}><error type='auth'><not-authorized/></error></iq>")
+            return
+        if elem.get('type') in ('result', 'error'):
+            return
+        payload = f"<query xmlns='{NS_ROSTER}'/>" if elem.find(_tag(NS_ROSTER, 'query')) is not None else ''
+        self.session.deliver(f"<iq type='result' id={iq_id} to={quoteattr(self.session.jid)}>{payload}</iq>")
+
+    def _presence(self, elem):
+        to = elem.get('to')
+        if self.session is None or not to or '/' not in to:
+            return  # 只处理发往房间的 presence
+        room, nick = to.split('/', 1)
+        if elem.get('type') == 'unavailable':
+            self.fake._leave(self.session, room)
+        else:
+            self.fake._join(self.session, room, nick, elem.find(_tag(NS_MUC, 'x')))
+
+    def _message(self, elem):
+        room = _bare(elem.get('to', ''))
+        if self.session is None or elem.get('type') != 'groupchat' or room not in self.session.rooms:
+            return
+        self.fake._broadcast_message(room, self.session.rooms[room], elem.findtext(_tag(NS_CLIENT, 'body')) or '')
+
+    def _stream_management(self, elem):
+        name = elem.tag.split('}', 1)[1]
+        if name == 'enable' and self.session is not None and self.fake.stream_management:
+            self.session.sm_id = secrets.token_hex(8)
+            with self.fake._lock:
+                self.fake._sessions[self.session.sm_id] = self.session
+                self.fake.stats['enabled'] += 1
+            self.send(f"<enabled xmlns='{NS_SM}' id='{self.session.sm_id}' resume='true' max='{self.fake.resume_timeout}'/>")
+        elif name == 'r' and self.session is not None:
+            self.send(f"<a xmlns='{NS_SM}' h='{self.session.handled}'/>")
+        elif name == 'a' and self.session is not None:
+            self.session.ack(int(elem.get('h', 0)))
+        elif name == 'resume' and self.authenticated:
+            self._resume(elem)
+        else:
+            self.send(f"<failed xmlns='{NS_SM}'><unexpected-request xmlns='urn:ietf:params:xml:ns:xmpp-stanzas'/></failed>")
+
+    def _resume(self, elem):
+        with self.fake._lock:
+            session = self.fake._sessions.get(elem.get('previd'))
+        if session is None or _bare(session.jid) != f'{self.user}@{self.fake.domain}':
+            with self.fake._lock:
+                self.fake.stats['failed'] += 1
+            self.send(f"<failed xmlns='{NS_SM}'><item-not-found xmlns='urn:ietf:params:xml:ns:xmpp-stanzas'/></failed>")
+            return
+        # 同一会话的旧连接可能还没有被发现已断开
+        old = session.sock
+        if old is not None and old is not self.request:
+            try:
+                old.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.session = session
+        with self.fake._lock:
+            self.fake.stats['resumed'] += 1
+        self.send(f"<resumed xmlns='{NS_SM}' previd='{session.sm_id}' h='{session.handled}'/>")
+        for data in session.resume(self.request, int(elem.get('h', 0))):
+            session.deliver(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟的 XMPP 服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5222)
+    parser.add_argument('--domain', default='localhost')
+    parser.add_argument('--no-sm', action='store_true', help='不提供流管理')
+    parser.add_argument('--resume-timeout', type=int, default=60, help='会话可恢复的时间（秒）')
+    args = parser.parse_args()
+
+    server = FakeXMPPServer(
+        args.host, args.port, args.domain,
+        stream_management=not args.no_sm, resume_timeout=args.resume_timeout,
+    ).start()
+    print(f"FakeXMPP listening on {server.address[0]}:{server.address[1]} ({args.domain})")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+XEP-0198 流管理（Stream Management），供 XMPP 桥接使用。
+
+xmpppy 不支持流管理，这里在其 Client 之上实现：
+- 开启流管理后统计收发的 stanza 数，按需请求和回复确认（<r/>、<a/>）
+- 服务器未确认的出站 stanza 保留在队列中
+- 断线后在 SASL 认证之后直接恢复会话（<resume/>），无需重新绑定资源、
+  发送 presence 和加入房间，恢复后只重发服务器没有收到的 stanza
+"""
+
+from collections import deque
+import logging
+import time
+
+import xmpp
+
+NS_SM = 'urn:xmpp:sm:3'
+STANZAS = ('message', 'presence', 'iq')
+
+logger = logging.getLogger('StreamManagement')
+
+
+def sasl_auth(client, user, password):
+    """
+    只做 SASL 认证，不绑定资源，恢复会话前使用。
+
+    Returns:
+        bool: 是否认证成功，成功时新的 stream features 已收到
+    """
+    while not client.Dispatcher.Stream._document_attrs and client.Process(1):
+        pass
+    while not client.Dispatcher.Stream.features and client.Process(1):
+        pass
+    xmpp.auth.SASL(user, password).PlugIn(client)
+    if client.SASL.startsasl == 'not-supported':
+        return False
+    client.SASL.auth()
+    while client.SASL.startsasl == 'in-process' and client.Process(1):
+        pass
+    if client.SASL.startsasl != 'success':
+        return False
+    # 认证成功后流会重新开始，等待新的 features
+    while not client.Dispatcher.Stream.features and client.Process(1):
+        pass
+    return True
+
+
+def bind(client, resource=''):
+    """恢复会话失败时在同一个流上绑定资源，与 Client.auth 的后半部分相同"""
+    xmpp.auth.Bind().PlugIn(client)
+    while client.Bind.bound is None and client.Process(1):
+        pass
+    if client.Bind.Bind(resource):
+        client.connected += '+sasl'
+        return True
+    return False
+
+
+class StreamManagement:
+    """跨连接保存的流管理状态，每次建立新连接后调用 attach()"""
+
+    def __init__(self, ack_every=5, max_unacked=1000, timeout=10):
+        """
+        Args:
+            ack_every: 每发送多少个 stanza 请求一次确认
+            max_unacked: 最多保留的未确认 stanza 数，超出时丢弃最旧的
+            timeout: 等待 <enabled/>、<resumed/> 的时间（秒）
+        """
+        self.ack_every = ack_every
+        self.max_unacked = max_unacked
+        self.timeout = timeout
+        self.client = None
+        self.enabled = False
+        self.session_id = None  # 服务器允许恢复时的会话ID
+        self.max_resume = 0  # 服务器允许的恢复时限（秒）
+        self.lost_at = None  # 连接断开的时间
+        self.handled = 0  # 已处理的入站 stanza 数（h）
+        self.sent = 0  # 已发送的出站 stanza 数
+        self.acked = 0  # 服务器已确认的出站 stanza 数
+        self.unacked = deque()  # (序号, stanza)
+        self._previous = []  # 上一个无法恢复的会话中未确认的消息
+        self._result = None
+        self._raw_send = None
+        self.stats = {'enabled': 0, 'resumed': 0, 'failed': 0, 'resent': 0}
+
+    def supported(self, client):
+        features = client.Dispatcher.Stream.features
+        return features is not None and features.getTag('sm', namespace=NS_SM) is not None
+
+    def can_resume(self):
+        if self.session_id is None:
+            return False
+        return self.lost_at is None or time.monotonic() - self.lost_at < self.max_resume
+
+    def connection_lost(self):
+        """连接断开时调用，开始计算恢复时限"""
+        if self.enabled:
+            self.enabled = False
+            self.lost_at = time.monotonic()
+
+    def attach(self, client):
+        """
+        接管新连接：注册流管理元素的处理函数，并包装 client.send 以统计出站 stanza。
+        必须在认证完成之后调用（SASL 成功后 xmpppy 会重建 Dispatcher 并覆盖 send）。
+        """
+        self.client = client
+        self.enabled = False
+        self._raw_send = client.send
+        client.Dispatcher.RegisterNamespace(NS_SM)
+        for name in ('enabled', 'resumed', 'failed', 'r', 'a'):
+            client.RegisterHandler(name, self._on_sm, xmlns=NS_SM)
+        for name in STANZAS:
+            # system=1：等待中的 iq 响应不会交给普通处理函数，但也要计数
+            client.RegisterHandler(name, self._on_inbound, makefirst=1, system=1)
+        client.send = self.send
+
+    def send(self, stanza):
+        result = self._raw_send(stanza)
+        if self.enabled and isinstance(stanza, xmpp.Node) and stanza.getName() in STANZAS:
+            self.sent += 1
+            self.unacked.append((self.sent, stanza))
+            if len(self.unacked) > self.max_unacked:
+                self.unacked.popleft()
+                logger.warning("Too many unacked stanzas, oldest will not be resent")
+            if self.sent % self.ack_every == 0:
+                self.request_ack()
+        return result
+
+    def request_ack(self):
+        """有未确认的 stanza 时请求服务器确认"""
+        if self.enabled and self.unacked:
+            self._raw_send(f"<r xmlns='{NS_SM}'/>")
+
+    def enable(self):
+        """开启流管理（新会话），返回是否成功"""
+        # 上一个会话中 presence 和 iq 会在新会话中重新发送，只需保留消息
+        self._previous.extend(stanza for _, stanza in self.unacked if stanza.getName() == 'message')
+        self.unacked.clear()
+        self.handled = 0
+        self.sent = 0
+        self.acked = 0
+        self.session_id = None
+        self.lost_at = None
+        self._raw_send(f"<enable xmlns='{NS_SM}' resume='true'/>")
+        if self._wait() != 'enabled':
+            logger.warning("Server refused to enable stream management")
+            return False
+        self.stats['enabled'] += 1
+        return True
+
+    def resume(self):
+        """
+        恢复上一个会话，成功时重发服务器未收到的 stanza。
+
+        Returns:
+            bool: 是否恢复成功；失败时开启新会话后可通过 take_unacked() 取出未确认的消息
+        """
+        self._raw_send(f"<resume xmlns='{NS_SM}' h='{self.handled}' previd='{self.session_id}'/>")
+        if self._wait() != 'resumed':
+            self.stats['failed'] += 1
+            self.session_id = None
+            logger.info("Stream resumption failed, starting a new session")
+            return False
+        self.stats['resumed'] += 1
+        self.lost_at = None
+        pending = [stanza for _, stanza in self.unacked]
+        self.unacked.clear()
+        self.sent = self.acked
+        for stanza in pending:
+            self.send(stanza)
+        self.stats['resent'] += len(pending)
+        self.request_ack()
+        logger.info(f"Stream resumed, resent {len(pending)} unacked stanzas")
+        return True
+
+    def take_unacked(self):
+        """取出上一个会话中服务器未确认的消息，需在新会话中重发"""
+        pending, self._previous = self._previous, []
+        self.stats['resent'] += len(pending)
+        return pending
+
+    def _wait(self):
+        self._result = None
+        deadline = time.monotonic() + self.timeout
+        while self._result is None and time.monotonic() < deadline:
+            if not self.client.Process(1):
+                break
+        return self._result
+
+    def _ack(self, h):
+        while self.unacked and self.unacked[0][0] <= h:
+            self.unacked.popleft()
+        self.acked = h
+
+    def _on_inbound(self, conn, stanza):
+        if self.enabled:
+            self.handled += 1
+
+    def _on_sm(self, conn, node):
+        name = node.getName()
+        if name == 'r':
+            self._raw_send(f"<a xmlns='{NS_SM}' h='{self.handled}'/>")
+        elif name == 'a':
+            self._ack(int(node.getAttr('h')))
+        elif name == 'enabled':
+            self.enabled = True
+            if node.getAttr('resume') in ('true', '1'):
+                self.session_id = node.getAttr('id')
+                self.max_resume = int(node.getAttr('max') or 300)
+            self._result = 'enabled'
+        elif name == 'resumed':
+            self._ack(int(node.getAttr('h')))
+            self.enabled = True  # 服务器紧接着重发的 stanza 也要计数
+            self._result = 'resumed'
+        elif name == 'failed':
+            self._result = 'failed'
+        raise xmpp.NodeProcessed
@@ -1,4 +1,7 @@
+import os
+import sys
 import threading
+from collections import OrderedDict, deque
 import time
 import datetime
 import ssl
@@ -8,13 +11,13 @@ import irc.client
 import irc.connection
 import xml.etree.ElementTree as ET
 
-# 配置日志
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-logger = logging.getLogger('Bridge')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from irc_encoder import IRCEncoder
+from irc_scheduler import IRCSendScheduler
+from relay_hub import RelayHub
+from supervisor import Backoff, Supervisor
+import tls
+from StreamManagement import StreamManagement, bind, sasl_auth
 
 # 状态控制变量
 relay_enabled = threading.Event()
@@ -38,9 +41,18 @@ def load_config(config_path="config.xml"):
 # 加载配置
 config = load_config()
 
+# 配置日志，级别由 config.xml 中的 LOG_LEVEL 指定，默认 INFO
+logging.basicConfig(
+    level=(config.get("LOG_LEVEL") or "INFO").strip().upper(),
+    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger('Bridge')
+
 # IRC 设置
 IRC_SERVER = config.get("IRC_SERVER")
 IRC_PORT = int(config.get("IRC_PORT"))
+IRC_SSL = (config.get("IRC_SSL") or "").strip().lower() in ("1", "true", "yes")
 IRC_NICK = config.get("IRC_NICK")
 IRC_CHANNEL = config.get("IRC_CHANNEL")
 
@@ -49,49 +61,218 @@ XMPP_JID = config.get("XMPP_JID")
 XMPP_PASSWORD = config.get("XMPP_PASSWORD")
 XMPP_ROOM = config.get("XMPP_ROOM")
 XMPP_NICK = config.get("XMPP_NICK")
+# 可选，直接指定服务器地址（例如本地的 FakeXMPP），未设置时通过 SRV 记录查找
+XMPP_SERVER = config.get("XMPP_SERVER")
+XMPP_PORT = int(config.get("XMPP_PORT") or 5222)
+
+# 事件循环模式：threaded 为 XMPP 和 IRC 各用一个线程；single 为两者共用 IRC reactor 的 select 循环
+EVENT_LOOP = (config.get("EVENT_LOOP") or "threaded").strip().lower()
 
-# 为旧版 xmpp 库 patch SSL
+# 为旧版 xmpp 库 patch SSL：使用共用的 SSLContext，重连时恢复 TLS 会话
 def wrap_socket(sock, keyfile=None, certfile=None, server_side=False,
                 do_handshake_on_connect=True, suppress_ragged_eofs=True):
-    context = ssl.create_default_context()
-    context.check_hostname = False
-    logger.debug("Wrapping socket with custom SSL context")
-    return context.wrap_socket(sock, server_hostname=None)
+    logger.debug("Wrapping socket with shared SSL context")
+    return tls.wrap_socket(sock, check_hostname=False)
 ssl.wrap_socket = wrap_socket
 
+NS_STANZA_ID = 'urn:xmpp:sid:0'
+NS_DELAY = 'urn:xmpp:delay'
+
+
+class SeenIds:
+    """线程安全的有界ID集合，超出容量时淘汰最早加入的ID"""
+
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, item_id):
+        """加入ID，已存在时返回False"""
+        with self._lock:
+            if item_id in self._ids:
+                return False
+            self._ids[item_id] = None
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+            return True
+
+
+class BridgeReactor(irc.client.Reactor):
+    """
+    把 XMPP 连接的 socket 也加入 IRC reactor 的 select 循环，
+    一个线程同时处理两边的收发，XMPP 数据到达时立即处理，无需轮询
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.xmpp_bot = None
+
+    @property
+    def sockets(self):
+        sockets = super().sockets
+        xmpp_sock = self.xmpp_bot.socket() if self.xmpp_bot else None
+        if xmpp_sock is not None:
+            sockets.append(xmpp_sock)
+        return sockets
+
+    def process_once(self, timeout=0):
+        # TLS 层已缓存的数据不会让 select 返回可读，此时不能阻塞等待
+        if self.xmpp_bot is not None and self.xmpp_bot.has_buffered_data():
+            timeout = 0
+        super().process_once(timeout)
+
+    def process_data(self, sockets):
+        xmpp_sock = self.xmpp_bot.socket() if self.xmpp_bot else None
+        if xmpp_sock is not None and (xmpp_sock in sockets or self.xmpp_bot.has_buffered_data()):
+            self.xmpp_bot.process_once()
+        super().process_data([sock for sock in sockets if sock is not xmpp_sock])
+
 class XMPPBot:
-    def __init__(self, jid, password, room, nick, irc_send_callback=None):
+    def __init__(self, jid, password, room, nick, irc_send_callback=None, reactor=None, server=None):
+        """
+        reactor 为 BridgeReactor 时使用单线程模式：XMPP 的接收、发送和重连都在 reactor 线程中完成，
+        否则使用独立的接收线程（process）和发送线程。
+        server 为可选的 (host, port)，未提供时通过 SRV 记录查找
+        """
         self.client = xmpp.Client(jid.split("@")[1], debug=[])
+        self.server = server
+        self.ready = False  # 认证并加入（或恢复）房间后为True
+        # XEP-0198 流管理：短暂断线后恢复会话，只重发服务器未确认的消息
+        self.sm = StreamManagement()
         self.jid = xmpp.JID(jid)
         self.password = password
         self.room_jid = xmpp.JID(room)
         self.nick = nick
         self.irc_send_callback = irc_send_callback
-        self.message_buffer = []  # 添加消息缓冲区
+        # 发送队列：调用方入队后立即返回，由发送线程负责发送和断线重连
+        self.outbox = deque()
+        self.max_backlog = 500
+        self._outbox_cond = threading.Condition()
+        self._connect_lock = threading.Lock()
+        self._generation = 0  # 每次连接成功后递增，避免两个线程重复重连
+        self.send_stats = {'sent': 0, 'dropped': 0, 'last_latency': 0.0, 'avg_latency': 0.0}
+        # 房间成员表：昵称 -> {'role', 'affiliation', 'show'}，随 presence 增量更新
+        self.occupants = {}
+        # 已处理过的消息ID和最后一条消息的时间，重新加入房间时用于去重和只请求之后的历史
+        self.seen_ids = SeenIds()
+        self.last_seen = None
+        self.reactor = reactor
+        self._reconnect_pending = False
+        self._backoff = Backoff(initial=5, maximum=300)  # 连续重连失败时逐渐延长间隔
+        self.supervisor = None  # 可选，用于在状态中报告各组件的重启次数
+        self.hub = None  # 中继模式下的 RelayHub，消息直接发布到其他平台，不经过 IRC
+        if reactor is not None:
+            reactor.xmpp_bot = self
+            # 连接恢复后补发积压消息
+            reactor.scheduler.execute_every(1, self._drain_outbox)
+        else:
+            threading.Thread(target=self._sender_loop, name="XMPP-Sender", daemon=True).start()
         logger.debug(f"Initialized XMPPBot: {jid} -> {room} as {nick}")
 
     def connect(self):
-        while True:
-            try:
-                logger.info("Connecting to XMPP server...")
-                if not self.client.connect():
-                    raise Exception("XMPP连接失败")
-                logger.info("Authenticating XMPP...")
+        with self._connect_lock:
+            self._connect()
+
+    def reconnect(self, generation=None):
+        """
+        断线后重连。generation 为出错时的连接代数，若另一个线程已经重连过则直接返回
+        """
+        with self._connect_lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._connect()
+
+    def _connect(self):
+        while not self._connect_once():
+            time.sleep(self._backoff.next())
+
+    def _connect_once(self):
+        self.ready = False
+        self.sm.connection_lost()
+        try:
+            logger.info("Connecting to XMPP server...")
+            # 每次连接使用新的 Client，xmpppy 的插件不能在同一个 Client 上重复挂载
+            self.client = xmpp.Client(self.jid.getDomain(), debug=[])
+            if not self.client.connect(server=self.server):
+                raise Exception("XMPP连接失败")
+            logger.info("Authenticating XMPP...")
+            if self.sm.can_resume():
+                if not sasl_auth(self.client, self.jid.getNode(), self.password):
+                    raise Exception("XMPP认证失败")
+                self.register_handlers()
+                if self.sm.supported(self.client) and self.sm.resume():
+                    # 会话已恢复：房间成员身份仍然有效，无需发送 presence 和重新加入
+                    logger.info("XMPP stream resumed.")
+                    self.ready = True
+                    self._generation += 1
+                    self._backoff.reset()
+                    return True
+                if not bind(self.client):
+                    raise Exception("XMPP资源绑定失败")
+            else:
                 if not self.client.auth(self.jid.getNode(), self.password):
                     raise Exception("XMPP认证失败")
-                self.client.sendInitPresence()
-                self.client.RegisterHandler('presence', self.on_presence)
-                self.client.RegisterHandler('message', self.on_groupchat_message)
-                self.join_room()
-                logger.info(f"Join request sent to {self.room_jid}/{self.nick}, proceeding without explicit confirmation.")
-                break
-            except Exception as e:
-                logger.error(f"XMPP connection error: {e}, retrying in 5 seconds...")
-                time.sleep(5)
+                self.register_handlers()
+            if self.sm.supported(self.client):
+                self.sm.enable()
+            self.client.sendInitPresence()
+            self.occupants.clear()  # 重新加入房间时服务器会重新发送全部成员的 presence
+            self.join_room()
+            logger.info(f"Join request sent to {self.room_jid}/{self.nick}, proceeding without explicit confirmation.")
+            # 上一个会话中服务器未确认的消息
+            for stanza in self.sm.take_unacked():
+                self.client.send(stanza)
+            self.ready = True
+            self._generation += 1
+            self._backoff.reset()
+            return True
+        except Exception as e:
+            logger.error(f"XMPP connection error: {e}, will retry")
+            return False
+
+    def register_handlers(self):
+        self.client.RegisterHandler('presence', self.on_presence)
+        self.client.RegisterHandler('message', self.on_groupchat_message)
+        self.sm.attach(self.client)
+
+    def schedule_reconnect(self, generation=None, delay=None):
+        """
+        单线程模式下按退避间隔安排重连（包括第一次连接）。xmpppy 的连接、认证和流管理握手
+        会阻塞，在辅助线程中完成，握手期间 reactor 不处理 XMPP socket，IRC 不受影响
+        """
+        if self._reconnect_pending or (generation is not None and generation != self._generation):
+            return
+        self._reconnect_pending = True
+        self.ready = False
+        if delay is None:
+            delay = self._backoff.next()
+        self.reactor.scheduler.execute_after(delay, self._start_reconnect)
+
+    def _start_reconnect(self):
+        threading.Thread(target=self._reconnect_in_thread, name="XMPP-Connect", daemon=True).start()
+
+    def _reconnect_in_thread(self):
+        connected = self._connect_once()
+        # 回到 reactor 线程补发积压消息或安排下一次重连
+        with self.reactor.mutex:
+            self.reactor.scheduler.execute_after(0, lambda: self._reconnect_done(connected))
+
+    def _reconnect_done(self, connected):
+        self._reconnect_pending = False
+        if connected:
+            self._drain_outbox()
+        else:
+            self.schedule_reconnect()
 
     def join_room(self):
         pres = xmpp.Presence(to=f"{self.room_jid}/{self.nick}")
         x = xmpp.Node('x', {'xmlns': xmpp.NS_MUC})
+        # 首次加入不要历史消息，重连时只要最后一条消息之后的
+        if self.last_seen is None:
+            x.addChild('history', {'maxstanzas': '0'})
+        else:
+            x.addChild('history', {'since': self.last_seen})
         pres.addChild(node=x)
         logger.debug(f"Sending MUC join presence: {pres}")
         self.client.send(pres)
@@ -99,25 +280,157 @@ class XMPPBot:
     def on_presence(self, conn, presence):
         frm = presence.getFrom()
         typ = presence.getType() or 'available'
-        logger.debug(f"Presence received from {frm}: type={typ}, stanza={presence}")
+        # 序列化整个 stanza 开销较大，交给 logging 在需要输出时再格式化
+        logger.debug("Presence received from %s: type=%s, stanza=%s", frm, typ, presence)
+        if frm is None or frm.getStripped() != self.room_jid.getStripped():
+            return
+        nick = frm.getResource()
+        if not nick:
+            return
+        if typ == 'unavailable':
+            occupant = self.occupants.pop(nick, None)
+            x = presence.getTag('x', namespace=xmpp.NS_MUC_USER)
+            codes = {status.getAttr('code') for status in x.getTags('status')} if x else set()
+            # 303：改名，新昵称在 item 的 nick 属性中
+            new_nick = presence.getNick()
+            if '303' in codes and new_nick and occupant is not None:
+                self.occupants[new_nick] = occupant
+        elif typ == 'available':
+            self.occupants[nick] = {
+                'role': presence.getRole(),
+                'affiliation': presence.getAffiliation(),
+                'show': presence.getShow(),
+            }
+
+    def get_occupants(self):
+        """房间中的其他成员昵称（不含自己），直接从成员表返回"""
+        return sorted(nick for nick in list(self.occupants) if nick != self.nick)
 
     def send_message(self, message):
-        self.message_buffer.append(message)  # 缓存消息
-        while self.message_buffer:
+        """消息入队后立即返回，队列满时丢弃最旧的消息"""
+        with self._outbox_cond:
+            if len(self.outbox) >= self.max_backlog:
+                dropped, _ = self.outbox.popleft()
+                self.send_stats['dropped'] += 1
+                logger.warning(f"XMPP backlog full, dropped: {dropped}")
+            self.outbox.append((message, time.monotonic()))
+            self._outbox_cond.notify()
+        if self.reactor is not None:
+            # 单线程模式下已在 reactor 线程中，直接发送
+            self._drain_outbox()
+
+    def _send_groupchat(self, message):
+        to_jid = str(self.room_jid)
+        logger.debug(f"XMPP sending to {to_jid}: {message}")
+        self.client.send(xmpp.Message(to=to_jid, body=message, typ='groupchat'))
+        logger.info(f"Sent to XMPP: {message}")
+
+    def _mark_sent(self, queued_at):
+        latency = time.monotonic() - queued_at
+        with self._outbox_cond:
+            self.outbox.popleft()  # 发送成功后移除消息
+            self.send_stats['sent'] += 1
+            self.send_stats['last_latency'] = latency
+            self.send_stats['avg_latency'] = self.send_stats['avg_latency'] * 0.9 + latency * 0.1
+
+    def _drain_outbox(self):
+        """单线程模式：发送队列中的全部消息，出错时保留消息并安排重连"""
+        while self.outbox and self.is_ready():
+            message, queued_at = self.outbox[0]
+            try:
+                self._send_groupchat(message)
+            except Exception as e:
+                logger.error(f"XMPP send error: {e}, retrying...")
+                self.schedule_reconnect(self._generation)
+                return
+            self._mark_sent(queued_at)
+        if self.is_ready():
+            self.sm.request_ack()
+
+    def is_ready(self):
+        return self.ready and bool(self.client.isConnected())
+
+    def socket(self):
+        """当前连接的 socket（TLS 连接为 SSL socket），未连接或仍在握手时返回None"""
+        connection = getattr(self.client, 'Connection', None)
+        if connection is None or not self.ready or not self.client.isConnected():
+            return None
+        return getattr(connection, '_sslObj', None) or getattr(connection, '_sock', None)
+
+    def has_buffered_data(self):
+        sock = self.socket()
+        return isinstance(sock, ssl.SSLSocket) and sock.pending() > 0
+
+    def process_once(self):
+        """单线程模式：处理 socket 上已到达的数据，不阻塞"""
+        generation = self._generation
+        try:
+            result = self.client.Process(0)
+        except Exception as e:
+            logger.error(f"XMPP processing error: {e}, reconnecting...")
+            self.schedule_reconnect(generation)
+            return
+        if result is None or result == 0:
+            logger.error("XMPP connection closed, reconnecting...")
+            self.schedule_reconnect(generation)
+
+    def _sender_loop(self):
+        while True:
+            with self._outbox_cond:
+                while not self.outbox:
+                    self._outbox_cond.wait()
+                message, queued_at = self.outbox[0]
+            generation = self._generation
+            if not self.is_ready():
+                # 尚未连接或接收线程正在重连
+                time.sleep(1)
+                continue
             try:
-                to_jid = str(self.room_jid)
-                logger.debug(f"XMPP sending to {to_jid}: {self.message_buffer[0]}")
-                msg = xmpp.Message(to=to_jid, body=self.message_buffer[0], typ='groupchat')
-                self.client.send(msg)
-                logger.info(f"Sent to XMPP: {self.message_buffer[0]}")
-                self.message_buffer.pop(0)  # 发送成功后移除消息
+                self._send_groupchat(message)
             except Exception as e:
                 logger.error(f"XMPP send error: {e}, retrying...")
                 time.sleep(5)
-                self.connect()  # 重新连接
+                self.reconnect(generation)  # 重新连接
+                continue
+            self._mark_sent(queued_at)
+            if not self.outbox:
+                self.sm.request_ack()  # 队列发完后确认服务器已收到
+
+    def stanza_id(self, msg):
+        """房间分配的 stanza-id（XEP-0359），在房间内唯一；服务器不支持时返回None"""
+        room = self.room_jid.getStripped()
+        for tag in msg.getTags('stanza-id', namespace=NS_STANZA_ID):
+            if tag.getAttr('by') == room:
+                return tag.getAttr('id')
+        return None
+
+    def is_duplicate(self, msg):
+        """
+        记录消息ID和时间，已处理过的消息返回True。
+
+        优先按 stanza-id 去重。消息自身的 id 由发送方的客户端生成，不同成员之间、甚至同一成员
+        的不同消息之间都可能重复，因此没有 stanza-id 时只记录 (发送者, id)，仅用来识别重新加入
+        房间时服务器重放的历史消息（带有 delay）；实时消息总是转发
+        """
+        delay = msg.getTag('delay', namespace=NS_DELAY)
+        stanza_id = self.stanza_id(msg)
+        if stanza_id is not None:
+            duplicate = not self.seen_ids.add(stanza_id)
+        else:
+            fallback = (str(msg.getFrom()), msg.getID()) if msg.getID() else None
+            duplicate = fallback is not None and not self.seen_ids.add(fallback) and delay is not None
+        if duplicate:
+            return True
+        stamp = delay.getAttr('stamp') if delay else None
+        self.last_seen = stamp or datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        return False
 
     def on_groupchat_message(self, conn, msg):
         if msg.getType() == 'groupchat' and msg.getFrom().getResource() != self.nick:
+            # 重连后服务器重放的消息在格式化和转发前丢弃
+            if self.is_duplicate(msg):
+                logger.debug(f"Dropping replayed XMPP message {msg.getID()}")
+                return
             user = msg.getFrom().getResource()
             body = msg.getBody()
             logger.debug(f"XMPP message from {user}: {body}")
@@ -127,17 +440,11 @@ class XMPPBot:
             if body.startswith('!xmppirc '):
                 command = body.split(' ', 1)[1].strip()
                 logger.info(f"Received control command from XMPP: {command}")
-                if command in ('on', 'off', 'status'):  # 仅处理已定义的控制命令
+                if command in ('on', 'off', 'status', 'who'):  # 仅处理已定义的控制命令
                     self.handle_control(command)
-                else:
+                elif relay_enabled.is_set():
                     # 非控制命令的消息转发到 IRC
-                    formatted = f"[XMPP] {user}: {body}"
-                    logger.info(f"Relaying XMPP→IRC: {formatted}")
-                    if relay_enabled.is_set():
-                        try:
-                            self.irc_send_callback(formatted)
-                        except Exception as e:
-                            logger.error(f"Relay XMPP→IRC error: {e}")
+                    self.relay(user, body)
                 return
             # 避免多次封装：如果已有标签前缀则跳过
             if any(body.startswith(tag) for tag in TAG_PREFIXES):
@@ -151,14 +458,21 @@ class XMPPBot:
             elif "[DCMS]" in body:
                 body = body[body.index("[DCMS]"):]
             asis = body
-            formatted = f"[XMPP] {user}: {asis}"
-            logger.debug(f"Filtered XMPP message: {formatted}")
+            logger.debug(f"Filtered XMPP message: [XMPP] {user}: {asis}")
             if relay_enabled.is_set():
-                logger.info(f"Relaying XMPP→IRC: {formatted}")
-                try:
-                    self.irc_send_callback(formatted)
-                except Exception as e:
-                    logger.error(f"Relay XMPP→IRC error: {e}")
+                self.relay(user, asis)
+
+    def relay(self, user, body):
+        """转发到 IRC；中继模式下直接发布到中继中心"""
+        formatted = f"[XMPP] {user}: {body}"
+        logger.info(f"Relaying XMPP→IRC: {formatted}")
+        try:
+            if self.hub is not None:
+                self.hub.publish("xmpp", "XMPP", user, body)
+            else:
+                self.irc_send_callback(formatted)
+        except Exception as e:
+            logger.error(f"Relay XMPP→IRC error: {e}")
 
     def handle_control(self, cmd):
         logger.info(f"XMPP control cmd: {cmd}")
@@ -176,34 +490,83 @@ class XMPPBot:
                 irc_status = 'connected' if self.irc_send_callback.__self__.connection.is_connected() else 'disconnected'
             except:
                 pass
+            irc_queue = 'unknown'
+            try:
+                irc_queue = self.irc_send_callback.__self__.scheduler.depth()
+            except:
+                pass
             status_msg = (
                 f"Status: {'enabled' if relay_enabled.is_set() else 'disabled'} | "
-                f"Uptime: {str(uptime).split('.')[0]} | IRC: {irc_status} | XMPP: {xmpp_status}"
+                f"Uptime: {str(uptime).split('.')[0]} | IRC: {irc_status} | XMPP: {xmpp_status} | "
+                f"IRC queue: {irc_queue} | XMPP backlog: {len(self.outbox)} | "
+                f"XMPP send latency: {self.send_stats['avg_latency'] * 1000:.0f} ms"
             )
+            if self.supervisor:
+                status_msg += f" | Restarts: {self.supervisor.summary()}"
+            if self.hub:
+                status_msg += f" | Hub: {self.hub.summary()}"
             self.send_message(status_msg)
             logger.debug(f"Status: {status_msg}")
+        elif cmd == 'who':
+            occupants = self.get_occupants()
+            self.send_message(f"XMPP occupants ({len(occupants)}): {', '.join(occupants) or '-'}")
 
     def process(self):
         while True:
+            # 发送线程正在重连时不处理：新连接的认证、绑定和流管理握手只由重连的线程读取，
+            # 先取 client 再检查 ready，ready 为 True 时取到的一定是握手已完成的连接
+            generation = self._generation
+            client = self.client
+            if not self.ready or self._connect_lock.locked():
+                time.sleep(0.1)
+                continue
             try:
-                self.client.Process(1)
+                result = client.Process(1)
+                if result is None or result == 0:
+                    # xmpppy 在连接断开时不抛出异常，只返回 None 或 0
+                    raise IOError("XMPP connection closed")
             except Exception as e:
                 logger.error(f"XMPP processing error: {e}, reconnecting...")
-                self.connect()  # 重新连接
+                self.reconnect(generation)  # 重新连接
 
 class IRCBot:
-    def __init__(self, server, port, nickname, channel, xmpp_bot):
-        self.reactor = irc.client.Reactor()
-        self.connection = self.reactor.server().connect(server, port, nickname)
+    def __init__(self, server, port, nickname, channel, xmpp_bot, reactor=None, use_ssl=False):
+        """
+        reactor 为与 XMPPBot 共用的 BridgeReactor 时，所有调用都在同一线程，入队后立即发送；
+        use_ssl 为True时使用 TLS 连接，重连时恢复 TLS 会话
+        """
+        self.reactor = reactor or irc.client.Reactor()
+        self.pump_inline = reactor is not None
+        self.connection = self.reactor.server()
         self.connection.add_global_handler('welcome', self.on_connect)
         self.connection.add_global_handler('pubmsg', self.on_pubmsg)
+        self.connection.add_global_handler('disconnect', self.on_disconnect)
         self.xmpp_bot = xmpp_bot
         self.channel = channel
-        self.message_buffer = []  # 添加消息缓冲区
+        self._reconnect_pending = False
+        self._backoff = Backoff(initial=5, maximum=300)
+        # 发往 IRC 的消息先进入限速队列，其他线程只负责入队；
+        # 所有对连接的写操作和重连都在 reactor 线程中完成，每个 tick 批量发送一次
+        self.scheduler = IRCSendScheduler(
+            self.connection.privmsg,
+            is_ready=self.connection.is_connected,
+            on_error=self.on_send_error,
+            encoder=IRCEncoder(nickname),  # 过长的消息按 512 字节限制拆分，积压时合并短消息
+        )
+        self.reactor.scheduler.execute_every(0.2, self.scheduler.pump)
+        try:
+            # reconnect() 会沿用这里的参数，包括连接工厂
+            factory = tls.irc_connect_factory(server) if use_ssl else irc.connection.Factory()
+            self.connection.connect(server, port, nickname, connect_factory=factory)
+        except irc.client.ServerConnectionError as e:
+            logger.error(f"IRC connection error: {e}, will retry")
+            self.schedule_reconnect()
 
     def on_connect(self, connection, event):
         logger.info(f"IRC joined channel {self.channel}")
         connection.join(self.channel)
+        self._backoff.reset()
+        self.scheduler.wake()  # 连接恢复后立即发送积压的消息
 
     def process_message(self, msg):
         try:
@@ -226,7 +589,7 @@ class IRCBot:
         if msg.startswith('!xmppirc '):
             command = msg.split(' ', 1)[1].strip()
             logger.info(f"Received control command from IRC: {command}")
-            if command in ('on', 'off', 'status'):  # 仅处理已定义的控制命令
+            if command in ('on', 'off', 'status', 'who'):  # 仅处理已定义的控制命令
                 self.xmpp_bot.handle_control(command)
             else:
                 # 非控制命令的消息转发到 XMPP
@@ -257,39 +620,50 @@ class IRCBot:
             logger.error(f"Relay IRC→XMPP error: {e}")
 
     def send_to_irc(self, message):
-        self.message_buffer.append(message)  # 缓存消息
-        while self.message_buffer:
-            try:
-                self.connection.privmsg(self.channel, self.message_buffer[0])
-                logger.info(f"Sent to IRC: {self.message_buffer[0]}")
-                self.message_buffer.pop(0)  # 发送成功后移除消息
-            except Exception as e:
-                logger.error(f"IRC send error: {e}, retrying...")
-                time.sleep(5)
-                self.reconnect()  # 重新连接
+        """可在任意线程调用，只入队，由 reactor 线程发送"""
+        logger.info(f"Queued for IRC: {message}")
+        self.scheduler.submit(self.channel, message)
+        if self.pump_inline:
+            # XMPP 握手在辅助线程中进行时也可能调用，持有 reactor 的锁再写连接
+            with self.reactor.mutex:
+                self.scheduler.pump()
+
+    def on_send_error(self, error):
+        logger.error(f"IRC send error: {error}, retrying...")
+        self.schedule_reconnect()
+
+    def on_disconnect(self, connection, event):
+        logger.warning("Disconnected from IRC server.")
+        self.schedule_reconnect()
+
+    def schedule_reconnect(self):
+        """在 reactor 线程中按退避间隔延迟重连，重复调用只会重连一次"""
+        if self._reconnect_pending:
+            return
+        self._reconnect_pending = True
+        self.reactor.scheduler.execute_after(self._backoff.next(), self.reconnect)
 
     def reconnect(self):
-        while True:
-            try:
-                logger.info("Reconnecting to IRC server...")
-                self.connection = self.reactor.server().connect(IRC_SERVER, IRC_PORT, IRC_NICK)
-                self.connection.add_global_handler('welcome', self.on_connect)
-                self.connection.add_global_handler('pubmsg', self.on_pubmsg)
-                self.connection.join(self.channel)
-                logger.info("Reconnected to IRC server.")
-                break
-            except Exception as e:
-                logger.error(f"IRC reconnection error: {e}, retrying in 5 seconds...")
-                time.sleep(5)
+        try:
+            logger.info("Reconnecting to IRC server...")
+            self.connection.reconnect()
+        except Exception as e:
+            logger.error(f"IRC reconnection error: {e}, will retry")
+            self._reconnect_pending = False
+            self.schedule_reconnect()
+            return
+        self._reconnect_pending = False
+        logger.info("Reconnected to IRC server.")
 
     def start(self):
-        while True:
-            try:
-                logger.info("Starting IRC loop")
-                self.reactor.process_forever()
-            except Exception as e:
-                logger.error(f"IRC loop error: {e}, reconnecting...")
-                self.reconnect()  # 重新连接
+        """
+        运行 reactor 事件循环，出错时抛出异常，由 Supervisor 再次调用；
+        连接已断开时先安排重连，连接对象和发送队列保持不变。
+        """
+        if not self.connection.is_connected():
+            self.schedule_reconnect()
+        logger.info("Starting IRC loop")
+        self.reactor.process_forever()
 
 
 def run_xmpp_bot(xmpp_bot):
@@ -297,18 +671,57 @@ def run_xmpp_bot(xmpp_bot):
     xmpp_bot.process()
 
 
+def run_single_thread():
+    """XMPP 和 IRC 共用一个 select 循环"""
+    irc_bot = None
+    def irc_send(msg):
+        if irc_bot:
+            irc_bot.send_to_irc(msg)
+
+    reactor = BridgeReactor()
+    xmpp_bot = XMPPBot(XMPP_JID, XMPP_PASSWORD, XMPP_ROOM, XMPP_NICK, irc_send, reactor=reactor,
+                       server=(XMPP_SERVER, XMPP_PORT) if XMPP_SERVER else None)
+    irc_bot = IRCBot(IRC_SERVER, IRC_PORT, IRC_NICK, IRC_CHANNEL, xmpp_bot, reactor=reactor, use_ssl=IRC_SSL)
+    xmpp_bot.irc_send_callback = irc_bot.send_to_irc
+    # 先启动 IRC；XMPP 与之后的重连一样在后台连接，XMPP 服务器不可用时 IRC 照常工作
+    xmpp_bot.schedule_reconnect(delay=0)
+    xmpp_bot.supervisor = Supervisor(initial_delay=5)
+    xmpp_bot.supervisor.run("reactor", irc_bot.start)
+
+
+def attach_hub(hub: RelayHub, supervisor: Supervisor):
+    """
+    中继模式：不连接 IRC，XMPP 房间作为中继中心的一个目的地，
+    XMPP 连接在后台线程中由 supervisor 监督，立即返回
+    """
+    xmpp_bot = XMPPBot(XMPP_JID, XMPP_PASSWORD, XMPP_ROOM, XMPP_NICK,
+                       server=(XMPP_SERVER, XMPP_PORT) if XMPP_SERVER else None)
+    xmpp_bot.hub = hub
+    xmpp_bot.supervisor = supervisor
+    hub.register("xmpp", lambda message: xmpp_bot.send_message(message.format()))
+    supervisor.start("xmpp", run_xmpp_bot, xmpp_bot)
+    return xmpp_bot
+
+
 def main():
+    if EVENT_LOOP == "single":
+        run_single_thread()
+        return
     irc_bot = None
     def irc_send(msg):
         if irc_bot:
             irc_bot.send_to_irc(msg)
 
-    xmpp_bot = XMPPBot(XMPP_JID, XMPP_PASSWORD, XMPP_ROOM, XMPP_NICK, irc_send)
-    threading.Thread(target=run_xmpp_bot, args=(xmpp_bot,), daemon=True).start()
+    xmpp_bot = XMPPBot(XMPP_JID, XMPP_PASSWORD, XMPP_ROOM, XMPP_NICK, irc_send,
+                       server=(XMPP_SERVER, XMPP_PORT) if XMPP_SERVER else None)
+    # XMPP 和 IRC 分别监督，其中一个出错时只重启它自己，XMPPBot 的发送队列和流管理状态保持不变
+    supervisor = Supervisor(initial_delay=5)
+    xmpp_bot.supervisor = supervisor
+    supervisor.start("xmpp", run_xmpp_bot, xmpp_bot)
     time.sleep(2)
-    irc_bot = IRCBot(IRC_SERVER, IRC_PORT, IRC_NICK, IRC_CHANNEL, xmpp_bot)
+    irc_bot = IRCBot(IRC_SERVER, IRC_PORT, IRC_NICK, IRC_CHANNEL, xmpp_bot, use_ssl=IRC_SSL)
     xmpp_bot.irc_send_callback = irc_bot.send_to_irc
-    irc_bot.start()
+    supervisor.run("irc", irc_bot.start)
 
 if __name__ == '__main__':
     main()